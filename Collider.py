@@ -3,11 +3,20 @@ from tools import *  # 导入工具函数
 from settings import *  # 导入游戏设置
 
 vec = pg.math.Vector2  # 创建二维向量别名
+
+# 水管内部贴图缓存：(贴图, 宽, 高, 边距) -> 平铺好的Surface
+_pipe_textures = {}
 class Collider(pg.sprite.Sprite):
     """碰撞体类，用于检测碰撞的不可见区域"""
     
     def __init__(self, x, y, width, height,color=None):
         pg.sprite.Sprite.__init__(self)  # 调用父类构造函数
+        self.color = color  # 保存颜色，调试时画轮廓用
+        if not COLLIDER_SURFACES:
+            # 只保留矩形数据，不创建Surface，也不参与绘制
+            self.image = None
+            self.rect = pg.Rect(x, y, width, height)
+            return
         self.image = pg.Surface((width, height)).convert()  # 创建碰撞区域表面
         if color:
             self.image.fill(color)  # 有颜色就填充
@@ -39,12 +48,19 @@ class LineCollider(pg.sprite.Sprite):
         pg.sprite.Sprite.__init__(self)  # 调用父类构造函数
         
         self.orientation = orientation  # 线段方向
+        self.color = color  # 保存颜色，调试时画轮廓用
         
         # 根据方向设置碰撞体尺寸
         if orientation == 'horizontal':
             width, height = length, 1  # 水平线：长度=width，高度=1像素
         else:  # vertical
             width, height = 1, length  # 垂直线：宽度=1像素，长度=height
+        
+        if not COLLIDER_SURFACES:
+            # 只保留矩形数据，不创建Surface，也不参与绘制
+            self.image = None
+            self.rect = pg.Rect(x, y, width, height)
+            return
             
         self.image = pg.Surface((width, height)).convert()  # 创建碰撞区域表面
         if color:
@@ -175,42 +191,12 @@ class PipeInnerCollider(Collider):
         
         self.margin_y = margin_y
         
-        try:
-            # 尝试加载图片
-            original_image = load_image(image_path).convert_alpha()
-            img_width, img_height = original_image.get_size()
-            
-            # 计算目标尺寸（包含空气贴图部分）
-            target_width = width
-            target_height = height + margin_y*2 + 1
-            # target_height = height
-            
-            # 创建目标Surface
-            self.image = pg.Surface((target_width, target_height), pg.SRCALPHA).convert_alpha()
-            
-            # 更高效的平铺方法：使用循环和裁剪
-            for y_pos in range(0, target_height, img_height):
-                for x_pos in range(0, target_width, img_width):
-                    # 计算当前块的尺寸
-                    block_width = min(img_width, target_width - x_pos)
-                    block_height = min(img_height, target_height - y_pos)
-                    
-                    if block_width > 0 and block_height > 0:
-                        # 从原图片中裁剪出对应大小的块
-                        tile_block = original_image.subsurface((0, 0, block_width, block_height))
-                        
-                        # 如果块尺寸小于原图片尺寸，需要调整大小
-                        if block_width < img_width or block_height < img_height:
-                            tile_block = pg.transform.scale(tile_block, (block_width, block_height))
-                        
-                        # 绘制到目标Surface
-                        self.image.blit(tile_block, (x_pos, y_pos))
-            
-        except (FileNotFoundError, pg.error) as e:
-            # 如果图片加载失败，创建黑色矩形作为后备
-            print(f"警告: 无法加载图片 {image_path}，错误: {e}，使用黑色矩形代替")
-            self.image = pg.Surface((width, height + margin_y), pg.SRCALPHA).convert_alpha()
-            self.image.fill((0, 0, 0, 255))  # 黑色，不透明
+        # 有预烘焙图集时直接使用现成的贴图，否则现场平铺
+        entry = load_atlas_entry(atlas_key('pipe', image_path, width, height, margin_y))
+        if entry is not None:
+            self.image = entry['frames'][0]
+        else:
+            self.image = self.build_texture(image_path, width, height, margin_y)
         
         # 碰撞体矩形（实际有碰撞的区域）
         self.collision_rect = pg.Rect(x, y, 0, 0)
@@ -236,7 +222,49 @@ class PipeInnerCollider(Collider):
     def get_collision_rect(self):
         """获取实际碰撞的矩形区域"""
         return self.collision_rect
-    
+
+    def build_texture(self, image_path, width, height, margin_y):
+        """
+        用贴图平铺出水管内部的图像
+        
+        参数同 __init__，返回平铺好的Surface。
+        同样的 (贴图, 宽, 高, 边距) 只平铺一次，之后所有同尺寸的水管共用这张图（不要原地修改）
+        """
+        key = (image_path, width, height, margin_y)
+        image = _pipe_textures.get(key)
+        if image is not None:
+            return image
+        
+        try:
+            # 尝试加载图片
+            original_image = load_image(image_path, 'alpha')
+            img_width, img_height = original_image.get_size()
+            
+            # 计算目标尺寸（包含空气贴图部分）
+            target_width = width
+            target_height = height + margin_y*2 + 1
+            # target_height = height
+            
+            # 先平铺出一行（高度为一块贴图），最右边不满一块的部分直接按区域截取，不缩放
+            row_height = min(img_height, target_height)
+            row = pg.Surface((target_width, row_height), pg.SRCALPHA).convert_alpha()
+            for x_pos in range(0, target_width, img_width):
+                row.blit(original_image, (x_pos, 0), (0, 0, target_width - x_pos, row_height))
+            
+            # 创建目标Surface，再把这一行往下平铺，最下面不满一行的部分同样按区域截取
+            image = pg.Surface((target_width, target_height), pg.SRCALPHA).convert_alpha()
+            for y_pos in range(0, target_height, row_height):
+                image.blit(row, (0, y_pos), (0, 0, target_width, target_height - y_pos))
+            
+        except (FileNotFoundError, pg.error) as e:
+            # 如果图片加载失败，创建黑色矩形作为后备
+            print(f"警告: 无法加载图片 {image_path}，错误: {e}，使用黑色矩形代替")
+            image = pg.Surface((width, height + margin_y), pg.SRCALPHA).convert_alpha()
+            image.fill((0, 0, 0, 255))  # 黑色，不透明
+        
+        _pipe_textures[key] = image
+        return image
+
 
 class PipeInnerCollider_test(Collider):
     """水管内部碰撞体类，用于防止马里奥进入水管内部"""
@@ -0,0 +1,168 @@
+# 离线资源烘焙脚本
+# 把马里奥、敌人的动画帧和水管内部贴图全部切好、缩放好、翻转好，
+# 打包进一张图集 resources/cache/atlas.bin（原始RGBA像素），索引写到 resources/cache/atlas.json。
+# 游戏运行时只需读入这一个文件，不用再解码各个源图和缩放。
+#
+# 用法:
+#   python bake_assets.py            烘焙图集
+#   python bake_assets.py --measure  烘焙前后各测一次冷启动 Game.new() 的耗时
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 离线运行，不需要真正的窗口
+
+import tools
+import level_data
+from tools import *
+from settings import *
+from level_d import Level
+import enemy
+
+ATLAS_WIDTH = 2048  # 图集宽度，帧按行（货架）排列
+PADDING = 1         # 帧之间留的空隙，避免缩放时串色
+
+
+def collect_levels():
+    """找出 level_data 里所有形如 levelN_data 的关卡字典"""
+    names = sorted((name for name in dir(level_data) if re.fullmatch(r'level\d+_data', name)),
+                   key=lambda name: int(re.search(r'\d+', name).group()))
+    return [getattr(level_data, name) for name in names]
+
+
+def collect_entries():
+    """
+    逐个构建关卡，收集需要烘焙的所有图像
+
+    返回:
+        dict: 条目名 -> {'frames': [Surface, ...], 其他附加信息}
+    """
+    entries = {}
+    for data in collect_levels():
+        level = Level(data)
+
+        # 马里奥
+        entries[atlas_key('Mario', 'mario21.png', MARIO_SIZE)] = {
+            'frames': list(level.mario.frames),
+        }
+
+        # 水管内部贴图
+        for collider in level.pipe_inner_colliders:
+            name = atlas_key('pipe', collider.image_path, collider.collision_width,
+                             collider.collision_height, collider.margin_y)
+            entries[name] = {'frames': [collider.image]}
+
+    # 敌人：构建关卡时已经全部登记在共享帧集里
+    for (enemy_class, sheet_path, scaled_w, scaled_h), (frames, walk_frame_count) in enemy._frame_sets.items():
+        name = atlas_key(enemy_class.__name__, sheet_path, scaled_w, scaled_h)
+        entries[name] = {'frames': list(frames), 'walk_frame_count': walk_frame_count}
+
+    return entries
+
+
+def pack(entries):
+    """
+    用货架算法把所有帧排进一张图集
+
+    返回:
+        (Surface, dict): 图集和条目索引（帧换成图集上的矩形）
+    """
+    # 先收集所有帧并按高度从高到低排序，货架更紧凑
+    frames = []
+    for name, entry in entries.items():
+        for i, frame in enumerate(entry['frames']):
+            frames.append((frame.get_height(), name, i, frame))
+    frames.sort(key=lambda item: -item[0])
+
+    rects = {}
+    x = y = shelf_height = 0
+    for height, name, i, frame in frames:
+        width = frame.get_width()
+        if x + width > ATLAS_WIDTH:
+            # 换到下一层货架
+            x = 0
+            y += shelf_height + PADDING
+            shelf_height = 0
+        rects[(name, i)] = (x, y, width, height)
+        x += width + PADDING
+        shelf_height = max(shelf_height, height)
+
+    atlas = pg.Surface((ATLAS_WIDTH, max(1, y + shelf_height)), pg.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    for height, name, i, frame in frames:
+        # 带颜色键的帧贴上去后，透明色的位置保持透明
+        atlas.blit(frame, rects[(name, i)][:2])
+
+    index = {}
+    for name, entry in entries.items():
+        info = {key: value for key, value in entry.items() if key != 'frames'}
+        info['frames'] = [rects[(name, i)] for i in range(len(entry['frames']))]
+        index[name] = info
+    return atlas, index
+
+
+def bake():
+    """烘焙图集并写入磁盘"""
+    pg.init()
+    pg.display.set_mode((1, 1))
+    tools.ATLAS_ENABLED = False  # 烘焙时必须现场切帧，不能读旧图集
+
+    start = time.perf_counter()
+    entries = collect_entries()
+    atlas, index = pack(entries)
+
+    graphics = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'graphics')
+    sources = {filename: os.path.getmtime(os.path.join(graphics, filename))
+               for filename in os.listdir(graphics)}
+
+    os.makedirs(atlas_path(), exist_ok=True)
+    with open(atlas_path('atlas.bin'), 'wb') as f:
+        f.write(pg.image.tobytes(atlas, 'RGBA'))
+    with open(atlas_path('atlas.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': ATLAS_VERSION, 'size': atlas.get_size(), 'sources': sources,
+                   'entries': index}, f, indent=1)
+
+    frame_count = sum(len(entry['frames']) for entry in index.values())
+    print(f"图集已生成: {len(index)} 个条目, {frame_count} 帧, "
+          f"尺寸 {atlas.get_width()}x{atlas.get_height()}, "
+          f"耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+# 子进程里执行的冷启动计时代码：只计 Game.new()，
+# Python和pygame的启动、关卡切换提示里的固定等待都不计入
+MEASURE_CODE = '''
+import os, time
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import tools
+tools.ATLAS_ENABLED = {use_atlas}
+from main2 import Game
+Game.show_level_transition = lambda self, level_num: None
+game = Game()
+start = time.perf_counter()
+game.new()
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+def measure_cold_start(use_atlas, runs=3):
+    """在全新的进程里测量 Game.new() 的耗时（毫秒），取多次中的最小值"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', MEASURE_CODE.format(use_atlas=use_atlas)],
+                                cwd=here, capture_output=True, text=True, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+if __name__ == '__main__':
+    if '--measure' in sys.argv:
+        before = measure_cold_start(False)
+        bake()
+        after = measure_cold_start(True)
+        print(f"冷启动 Game.new(): 不用图集 {before:.1f} ms, 使用图集 {after:.1f} ms")
+    else:
+        bake()
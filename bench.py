@@ -0,0 +1,307 @@
+# 帧流水线基准测试
+# 无窗口运行几个固定的场景，统计每一步里各个环节的耗时，输出 p50/p95/p99（毫秒）的JSON，
+# 可以保存为基线，之后的运行和基线比较，找出变慢的环节。
+# 每个场景重复运行几次，比较时只看各次运行p50的中位数，p95只打印出来参考：
+# 单次运行的p95受偶发的停顿影响很大，同样的代码连跑两次也能差20%以上。
+#
+# 场景:
+#   idle       关卡1，不按任何键
+#   run_right  关卡1，一路按住右键，隔一会儿跳一下越过水管
+#   climb      关卡2，左右来回并不停跳跃，在平台之间爬上爬下
+#   crowd      生成的关卡，200个敌人
+#   stress     level_gen 生成的压力测试关卡，约1万条线段、2500个敌人
+#
+# 用法:
+#   python bench.py                          运行所有场景，JSON打印到标准输出
+#   python bench.py idle crowd               只运行指定的场景
+#   python bench.py --out result.json        JSON写到文件
+#   python bench.py --save baseline.json     同时保存为基线
+#   python bench.py --compare baseline.json  和基线比较，有环节的p50中位数变慢超过阈值时返回1
+#   python bench.py --threshold 0.2          比较时允许的变慢比例（默认0.15）
+#   python bench.py --repeat 5               每个场景重复运行几次（默认3）
+import os
+import io
+import sys
+import json
+import time
+import platform
+import statistics
+import contextlib
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 离线运行，不需要真正的窗口
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # 标准输出只留JSON
+
+from tools import *
+from settings import *
+from level_data import *
+from main2 import Game
+from inputs import *
+from enemy import EnemyBase, Enemy2
+from enemy_batch import EnemyBatch
+from mario import Mario
+from level_d import Level
+from bench_enemies import make_level_data
+from level_gen import stress_level
+
+BENCH_VERSION = 2          # 结果格式版本（2: 多次运行，加了 p50_median）
+DEFAULT_THRESHOLD = 0.15   # 和基线比较时允许的变慢比例
+DEFAULT_REPEATS = 3        # 每个场景默认重复运行几次
+MIN_REGRESSION_MS = 0.05   # 比基线慢得少于这个值（毫秒）时不算变慢：同样的代码两次运行之间的差别就有这么大
+
+# 要统计的环节：名字 -> 被计时的 (类, 方法名)，同一环节的多个方法耗时相加；
+# 同一环节的方法互相调用时（EnemyBatch.step 调用 EnemyBase.update，Enemy2.update 调用父类的 update）只计最外层
+SUBSYSTEMS = {
+    'Mario.update': [(Mario, 'update')],
+    'EnemyBase.update': [(EnemyBase, 'update'), (Enemy2, 'update'), (EnemyBatch, 'step')],
+    'Level.check_collide': [(Level, 'check_collide')],
+    'Level.adjust_collisions': [(Level, 'adjust_collisions')],
+    'Level.check_enemy_collisions': [(Level, 'check_enemy_collisions')],
+    'Game.draw': [(Game, 'draw')],
+}
+
+LEFT, RIGHT, SPACE = 1, 2, 4  # WATCHED_KEYS 里对应的位
+
+
+def idle(tick):
+    return 0
+
+
+def run_right(tick):
+    return RIGHT | (SPACE if tick % 60 < 12 else 0)
+
+
+def climb(tick):
+    return (RIGHT if tick // 150 % 2 == 0 else LEFT) | (SPACE if tick % 30 < 10 else 0)
+
+
+def crowd_level(enemy_count=200, screens=10):
+    """生成的关卡，敌人都放在离马里奥两屏以外，测试的几百步里碰不到马里奥"""
+    data = make_level_data(enemy_count, screens)
+    start = 2 * WIDTH
+    span = screens * WIDTH - start - 100
+    data['enemy'] = [[kind, (start + i * span // enemy_count, y), scaled_w, scaled_h]
+                     for i, (kind, (x, y), scaled_w, scaled_h) in enumerate(data['enemy'])]
+    return data
+
+
+# 场景：名字 -> (关卡数据或生成关卡数据的函数, 输入脚本, 步数)
+# 生成的关卡在运行到这个场景时才生成，只跑别的场景时不用等
+SCENARIOS = {
+    'idle': (level1_data, idle, 600),
+    'run_right': (level1_data, run_right, 1200),
+    'climb': (level2_data, climb, 1200),
+    'crowd': (crowd_level, idle, 600),
+    'stress': (stress_level, idle, 120),
+}
+
+
+class Timers:
+    """给各环节的方法套上计时，记录每一步里每个环节花了多少时间"""
+
+    def __init__(self):
+        self.current = {name: 0.0 for name in SUBSYSTEMS}  # 这一步里各环节累计的秒数
+        self.samples = {name: [] for name in SUBSYSTEMS}   # 每一步各环节的耗时（毫秒）
+        self.ticks = []                                    # 每一步总耗时（毫秒）
+        self.depth = {name: 0 for name in SUBSYSTEMS}      # 各环节正在执行的计时方法层数
+        self.originals = []
+
+    def install(self):
+        for name, methods in SUBSYSTEMS.items():
+            for cls, method in methods:
+                original = cls.__dict__[method]
+                self.originals.append((cls, method, original))
+                setattr(cls, method, self.wrap(name, original))
+
+    def uninstall(self):
+        for cls, method, original in reversed(self.originals):
+            setattr(cls, method, original)
+        self.originals = []
+
+    def wrap(self, name, function):
+        current = self.current
+        depth = self.depth
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            if depth[name]:  # 已经在同一环节的计时里面，时间由外层算
+                return function(*args, **kwargs)
+            depth[name] = 1
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current[name] += clock() - start
+                depth[name] = 0
+        return timed
+
+    def end_tick(self, seconds):
+        """一步结束，把这一步各环节的耗时存下来"""
+        for name, value in self.current.items():
+            self.samples[name].append(value * 1000)
+            self.current[name] = 0.0
+        self.ticks.append(seconds * 1000)
+
+
+def percentile(values, p):
+    """最近秩法的百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))  # 向上取整
+    return ordered[int(rank) - 1]
+
+
+def summarize(values):
+    """耗时列表的 p50/p95/p99、平均值和最大值（毫秒）"""
+    return {
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'mean': round(sum(values) / len(values), 4) if values else 0.0,
+        'max': round(max(values), 4) if values else 0.0,
+    }
+
+
+def summarize_runs(runs):
+    """多次运行的耗时列表：合在一起的统计，另加各次运行p50的中位数（比较基线时用它）"""
+    stats = summarize([value for run in runs for value in run])
+    stats['p50_median'] = round(statistics.median(percentile(run, 50) for run in runs), 4)
+    return stats
+
+
+def run_scenario(game, name, repeats=DEFAULT_REPEATS):
+    """
+    运行一个场景 repeats 次：每一步模拟一次、绘制一次
+
+    返回:
+        dict: 步数、结局、每步总耗时和各环节耗时的统计
+    """
+    level_data, script, ticks = SCENARIOS[name]
+    if callable(level_data):
+        level_data = level_data()
+    game.levels[name] = level_data
+    runs = [run_once(game, name, script, ticks) for _ in range(repeats)]
+    timers, outcome = runs[-1]
+    return {
+        'ticks': len(timers.ticks),
+        'outcome': outcome,
+        'repeats': repeats,
+        'enemies': len(game.level.enemies),
+        'tick': summarize_runs([timers.ticks for timers, _ in runs]),
+        'subsystems': {key: summarize_runs([timers.samples[key] for timers, _ in runs])
+                       for key in SUBSYSTEMS},
+    }
+
+
+def run_once(game, name, script, ticks):
+    """
+    从头运行一次场景
+
+    返回:
+        (Timers, str): 各步的耗时、结局
+    """
+    game.input = ScriptedInput(script)
+    game.switch_level(name)
+
+    timers = Timers()
+    timers.install()
+    outcome = 'timeout'
+    try:
+        for _ in range(ticks):
+            start = time.perf_counter()
+            game.step()
+            game.draw()
+            timers.end_tick(time.perf_counter() - start)
+            if game.level.is_success():
+                outcome = 'success'
+                break
+            if game.game_over:
+                outcome = 'dead'
+                break
+    finally:
+        timers.uninstall()
+    return timers, outcome
+
+
+def run_bench(names, repeats=DEFAULT_REPEATS):
+    """运行指定的场景，返回完整的结果"""
+    game = Game(headless=True)
+    with contextlib.redirect_stdout(io.StringIO()):  # 游戏里的print不混进JSON
+        game.new()
+        scenarios = {name: run_scenario(game, name, repeats) for name in names}
+    return {
+        'version': BENCH_VERSION,
+        'python': platform.python_version(),
+        'pygame': pg.version.ver,
+        'sim_fps': SIM_FPS,
+        'scenarios': scenarios,
+    }
+
+
+def compare(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    和基线比较每个场景每个环节：p50中位数变慢超过阈值的算变慢，p95只列出来参考
+
+    返回:
+        (list, list): 各项比较的文字、变慢超过阈值的项
+    """
+    lines = []
+    regressions = []
+    for name, scenario in result['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            lines.append(f"{name}: 基线里没有这个场景")
+            continue
+        rows = [('tick', scenario['tick'], base['tick'])]
+        rows += [(key, stats, base['subsystems'].get(key)) for key, stats in scenario['subsystems'].items()]
+        for key, stats, base_stats in rows:
+            if base_stats is None:
+                continue
+            for p in ('p50_median', 'p95'):
+                if p not in base_stats:  # 旧版基线只有单次运行
+                    continue
+                now, before = stats[p], base_stats[p]
+                change = (now - before) / before if before else 0.0
+                line = f"{name:10} {key:30} {p:10}: {before:8.4f} -> {now:8.4f} ms ({change:+.0%})"
+                if p == 'p50_median' and change > threshold and now - before > MIN_REGRESSION_MS:
+                    regressions.append(line)
+                    line += '  变慢'
+                lines.append(line)
+    return lines, regressions
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {}
+    for option in ('--out', '--save', '--compare', '--threshold', '--repeat'):
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    names = args or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"未知的场景: {', '.join(unknown)}，可选: {', '.join(SCENARIOS)}")
+        sys.exit(2)
+
+    result = run_bench(names, int(options.get('--repeat', DEFAULT_REPEATS)))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if '--out' in options:
+        with open(options['--out'], 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if '--save' in options:
+        with open(options['--save'], 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    if '--compare' in options:
+        with open(options['--compare'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        threshold = float(options.get('--threshold', DEFAULT_THRESHOLD))
+        lines, regressions = compare(result, baseline, threshold)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} 项比基线慢超过 {threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,89 @@
+# 敌人地形碰撞基准测试
+# 在一张50屏宽的地图上放500个敌人，比较敌人碰撞检测遍历整组碰撞体、查询共享地形索引
+# 和NumPy批量物理（安装了NumPy时）的每帧耗时。
+#
+# 用法:
+#   python bench_enemies.py                  默认500个敌人、50屏宽、300帧
+#   python bench_enemies.py 1000 100 600     敌人数、屏数、帧数
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 离线运行，不需要真正的窗口
+
+from tools import *
+from settings import *
+from level_d import Level
+from enemy_batch import *
+
+PIPES_PER_SCREEN = 4  # 每屏放几根水管
+
+
+def make_level_data(enemy_count=500, screens=50):
+    """生成测试关卡：整条地面、两侧墙壁、均匀分布的水管和敌人"""
+    width = screens * WIDTH
+    pipe_count = screens * PIPES_PER_SCREEN
+    step = width // pipe_count
+    pipes = [[100 + i * step, GROUND_HEIGHT, 40 + (i % 3) * 20, 60 + (i % 5) * 30, (20, 150, 20)]
+             for i in range(pipe_count)]
+    enemies = [[1 + i % 2, (50 + (i * width) // enemy_count, GROUND_HEIGHT - 150), 100, 100]
+               for i in range(enemy_count)]
+    return {
+        'ground': [[0, GROUND_HEIGHT, width, (0, 222, 0)]],
+        'wall': [[0, 0, HEIGHT, (255, 0, 0)], [width - 1, 0, HEIGHT, (0, 255, 255)]],
+        'pipe': pipes,
+        'enemy': enemies,
+        'mario': [WIDTH // 2, GROUND_HEIGHT - 70],
+    }
+
+
+def measure(data, frames, use_terrain):
+    """
+    构建关卡，让所有敌人跑 frames 帧
+
+    返回:
+        float: 每帧更新所有敌人的平均耗时（毫秒）
+    """
+    reset_sim_clock()
+    level = Level(data)
+    if not use_terrain:
+        for enemy in level.enemies:
+            enemy.terrain = None
+    start = time.perf_counter()
+    for _ in range(frames):
+        advance_sim_clock()
+        for enemy in level.enemies:
+            enemy.update(level.horizontal_lines, level.vertical_lines)
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def measure_batch(data, frames):
+    """同 measure，但所有敌人放进 EnemyBatch 一起更新"""
+    reset_sim_clock()
+    level = Level(data)
+    batch = EnemyBatch(level.enemies, level.horizontal_lines, level.vertical_lines,
+                       rng=np.random.default_rng(0))
+    start = time.perf_counter()
+    for _ in range(frames):
+        advance_sim_clock()
+        batch.step(level.enemies)
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+if __name__ == '__main__':
+    enemy_count, screens, frames = ([int(arg) for arg in sys.argv[1:4]] + [500, 50, 300][len(sys.argv[1:4]):])
+    pg.init()
+    pg.display.set_mode((1, 1))
+
+    data = make_level_data(enemy_count, screens)
+    level = Level(data)
+    print(f"{enemy_count} 个敌人, {screens} 屏宽, {len(level.horizontal_lines)} 条水平线, "
+          f"{len(level.vertical_lines)} 条垂直线, {frames} 帧")
+
+    brute = measure(data, frames, use_terrain=False)
+    indexed = measure(data, frames, use_terrain=True)
+    print(f"遍历整组碰撞体: {brute:.2f} ms/帧")
+    print(f"查询地形索引:   {indexed:.2f} ms/帧")
+    if batch_available():
+        batched = measure_batch(data, frames)
+        print(f"批量物理:       {batched:.2f} ms/帧")
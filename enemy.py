@@ -2,19 +2,31 @@
 from tools import *  # 导入工具函数
 from settings import *  # 导入游戏设置
 from level_data import *
-from random import random
+from random import random, Random
 
 vec = pg.math.Vector2  # 创建二维向量别名
 
+# 共享帧集（享元）：键为 (敌人类, 精灵表, 缩放w, 缩放h)，值为 (帧元组, 走路帧数)
+# 同类型同缩放的敌人共用同一组帧，关卡加载的开销只和敌人种类有关，和敌人数量无关
+_frame_sets = {}
+
+# 没有关卡提供随机数流时（例如单独创建的敌人）使用的随机数生成器
+_default_rng = Random()
+
+
+def clear_frame_sets():
+    """清空共享帧集（例如修改了缩放逻辑后需要重新切帧）"""
+    _frame_sets.clear()
+
 
 class EnemyBase(pg.sprite.Sprite):
     """敌人基类，处理敌人的共同属性和方法"""
     def __init__(self, sprite_sheet_path, initial_pos=None, scaled_w=100, scaled_h=100):
         pg.sprite.Sprite.__init__(self)
         self.set_scale(scaled_w, scaled_h)
-        self.sheet = load_image(sprite_sheet_path)
-        self.load_from_sheet()
-        self.walking_timer = pg.time.get_ticks()
+        self.sheet_path = sprite_sheet_path
+        self.load_frames()
+        self.walking_timer = sim_ticks()
         self.image_index = 4
         self.image = self.frames[0]
         self.rect = self.image.get_rect()
@@ -29,6 +41,8 @@ class EnemyBase(pg.sprite.Sprite):
         self.landing = False
         self.dead = False
         self.direction = 1  # 1表示向右，-1表示向左
+        self.terrain = None  # 关卡的地形索引（由关卡设置），为None时遍历整组碰撞体
+        self.rng = _default_rng  # 随机数流（由关卡设置），转向和跳跃都从这里取随机数
         
         # 敌人特有的属性
         self.move_speed = 2
@@ -41,6 +55,36 @@ class EnemyBase(pg.sprite.Sprite):
     def set_scale(self, scaled_w, scaled_h):
         self.scaled_w = scaled_w
         self.scaled_h = scaled_h
+
+    def load_frames(self):
+        """
+        取得本敌人的动画帧
+        同一 (类, 精灵表, 缩放) 只在第一次调用 load_from_sheet 切帧，
+        之后的实例直接共用那一组帧（元组，不可修改）
+        """
+        key = (type(self), self.sheet_path, self.scaled_w, self.scaled_h)
+        frame_set = _frame_sets.get(key)
+        if frame_set is None:
+            # 优先使用预烘焙图集里的帧
+            entry = load_atlas_entry(atlas_key(*self.frame_set_name()))
+            if entry is not None:
+                frame_set = (tuple(entry['frames']), entry['walk_frame_count'])
+            else:
+                self.sheet = self.load_sheet()
+                self.load_from_sheet()
+                frame_set = (tuple(self.frames), self.walk_frame_count)
+                # 切完帧就不再需要中间结果
+                del self.sheet, self.right_frames, self.left_frames
+            _frame_sets[key] = frame_set
+        self.frames, self.walk_frame_count = frame_set
+
+    def frame_set_name(self):
+        """帧集在预烘焙图集中的名字：(类名, 精灵表, 缩放w, 缩放h)"""
+        return (type(self).__name__, self.sheet_path, self.scaled_w, self.scaled_h)
+
+    def load_sheet(self):
+        """加载精灵表（由图像缓存共享，只读）"""
+        return load_image(self.sheet_path, 'alpha')
             
     def update(self, horizontal_lines, vertical_lines):
         """更新敌人状态，需要传入碰撞体组进行碰撞检测"""
@@ -51,9 +95,9 @@ class EnemyBase(pg.sprite.Sprite):
         self.vel.x = self.direction * self.move_speed
         
         # 随机改变方向（有一定概率）
-        current_time = pg.time.get_ticks()
+        current_time = sim_ticks()
         if current_time - self.change_direction_timer > self.direction_change_interval:
-            if random() < 0.3:  # 30%的概率改变方向
+            if self.rng.random() < 0.3:  # 30%的概率改变方向
                 self.direction *= -1
             self.change_direction_timer = current_time
 
@@ -91,8 +135,11 @@ class EnemyBase(pg.sprite.Sprite):
         # 重置着陆状态
         self.landing = False
         
-        # 检测垂直线碰撞（墙壁）
-        vertical_collisions = pg.sprite.spritecollide(self, vertical_lines, False)
+        # 检测垂直线碰撞（墙壁），有地形索引时只检查附近的线
+        if self.terrain is not None:
+            vertical_collisions = self.terrain.spritecollide(self, 'vertical')
+        else:
+            vertical_collisions = pg.sprite.spritecollide(self, vertical_lines, False)
         for line in vertical_collisions:
             # 计算实际碰撞距离，考虑敌人的移动方向
             if self.vel.x > 0:  # 向右移动碰到墙壁
@@ -109,8 +156,11 @@ class EnemyBase(pg.sprite.Sprite):
                     self.vel.x = self.move_speed
             self.rect.midbottom = self.pos
         
-        # 检测水平线碰撞（地面/平台）
-        horizontal_collisions = pg.sprite.spritecollide(self, horizontal_lines, False)
+        # 检测水平线碰撞（地面/平台），有地形索引时只检查附近的线
+        if self.terrain is not None:
+            horizontal_collisions = self.terrain.spritecollide(self, 'horizontal')
+        else:
+            horizontal_collisions = pg.sprite.spritecollide(self, horizontal_lines, False)
         
         # 用于记录是否找到可站立的地面
         found_ground = False
@@ -161,12 +211,12 @@ class EnemyBase(pg.sprite.Sprite):
         """
         if self.image_index == 0:
             self.image_index += 1
-            self.walking_timer = pg.time.get_ticks()
+            self.walking_timer = sim_ticks()
         else:
             animation_speed = 130 - (abs(self.vel.x) * 6)
-            if (pg.time.get_ticks() - self.walking_timer > animation_speed):
+            if (sim_ticks() - self.walking_timer > animation_speed):
                 self.image_index += 1
-                self.walking_timer = pg.time.get_ticks()
+                self.walking_timer = sim_ticks()
         
         if facing == 'right':
             if self.image_index > walk_frame_count + 1:
@@ -535,6 +585,13 @@ class princess(EnemyBase):
         
       
         
+    def load_sheet(self):
+        """
+        公主不需要整张精灵表：原图是1400x1900的照片，
+        显示尺寸的图像由 load_display_image 生成并缓存，这里不解码原图
+        """
+        return None
+
     def load_from_sheet(self):
         """从精灵表中加载动画帧"""
         self.right_frames = []
@@ -547,23 +604,20 @@ class princess(EnemyBase):
         
         princessx=1400
         princessy=1900
-        # 加princess的帧（需要根据实际的enemy.png调整坐标）
-        self.right_frames.append(self.get_image(0, 0, princessx, princessy,scaled_w,scaled_h))  # 站立/移动帧1
-        self.right_frames.append(self.get_image(0, 0, princessx, princessy,scaled_w,scaled_h)) # 移动帧2
-        
-        # 跳跃/下落帧
-        self.right_frames.append(self.get_image(0, 0, princessx, princessy,scaled_w,scaled_h))
-        
-        # 通过翻转创建向左动画帧
-        for frame in self.right_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_frames.append(new_image)
+        # 公主只有一张图，直接取显示尺寸的版本，只生成一次、翻转一次
+        size = (int(princessx * scaled_w / 100), int(princessy * scaled_h / 100))
+        image = load_display_image(self.sheet_path, (0, 0, princessx, princessy), size, WHITE)
+        flipped = pg.transform.flip(image, True, False)
+
+        # 站立/移动帧1、移动帧2、跳跃/下落帧都用同一张图
+        self.right_frames = [image] * 3
+        # 向左动画帧
+        self.left_frames = [flipped] * 3
         
         # 合并所有帧
         self.frames = self.right_frames + self.left_frames
 
 
-
 class Enemy1(EnemyBase):
     """敌人类型1"""
     def __init__(self, initial_pos=None, scaled_w=100,scaled_h=100):
@@ -748,7 +802,7 @@ class Enemy2(EnemyBase):
         self.direction_change_interval = 2500
         self.jump_probability = 1.0 / 128.0  # 1/32的跳跃概率
         self.enemy_jump = ENEMY_JUMP  # 跳跃高度
-        self.jump_cooldown = 16*10  # 跳跃冷却时间
+        self.jump_cooldown = ENEMY_INITIAL_JUMP_COOLDOWN  # 跳跃冷却还剩几步
     
     def update(self, horizontal_lines, vertical_lines):
         """
@@ -764,22 +818,22 @@ class Enemy2(EnemyBase):
         self.vel.x = self.direction * self.move_speed
         
         # 随机改变方向（有一定概率）
-        current_time = pg.time.get_ticks()
+        current_time = sim_ticks()
         if current_time - self.change_direction_timer > self.direction_change_interval:
-            if random() < 0.3:  # 30%的概率改变方向
+            if self.rng.random() < 0.3:  # 30%的概率改变方向
                 self.direction *= -1
             self.change_direction_timer = current_time
         
         # 随机跳跃 - 1/32的概率跳跃（当敌人在地面上时）
         if (self.landing and 
-            random() < self.jump_probability and 
+            self.rng.random() < self.jump_probability and 
             self.jump_cooldown <= 0):
             
             self.vel.y = -self.enemy_jump
             self.landing = False
-            self.jump_cooldown = 500  # 设置500毫秒的跳跃冷却时间
+            self.jump_cooldown = ENEMY_JUMP_COOLDOWN  # 设置约500毫秒的跳跃冷却
         elif self.jump_cooldown > 0:
-            self.jump_cooldown -= 16  # 假设60fps，每帧减少约16毫秒
+            self.jump_cooldown -= 1  # 每个模拟步减少一步
             
             
             
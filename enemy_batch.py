@@ -0,0 +1,292 @@
+try:
+    import numpy as np  # 批量物理需要NumPy
+except ImportError:  # 没有安装NumPy时不能使用批量物理，敌人照常逐个更新
+    np = None
+
+from tools import *  # 导入工具函数
+from settings import *  # 导入游戏设置
+from level_data import *
+
+
+def batch_available():
+    """是否可以使用批量物理（安装了NumPy）"""
+    return np is not None
+
+
+def round_half_away(values):
+    """与 pygame 给 Rect 赋浮点坐标时的取整方式相同：四舍五入，.5 远离0"""
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+class LineTable:
+    """
+    线段碰撞体按x分格的查找表，给一批敌人一次性取出附近的线段
+
+    每个格子记下覆盖它的线段编号（按组内顺序），不足的位置用一条永远碰不到的哨兵线段补齐，
+    这样所有敌人的候选线段可以排成一个二维数组做向量化判断。
+    """
+
+    def __init__(self, lines, cell_size):
+        """
+        参数:
+            lines: 线段碰撞体（需要有 rect），编号即组内顺序
+            cell_size (int): 格子宽度，不能小于最宽的敌人，保证每个敌人最多跨两个格子
+        """
+        self.lines = list(lines)
+        rects = [line.rect for line in self.lines]
+        count = len(rects)
+        far = 2 ** 40  # 哨兵线段放在很远的地方
+        self.left = np.array([rect.left for rect in rects] + [far], dtype=np.int64)
+        self.right = np.array([rect.right for rect in rects] + [far], dtype=np.int64)
+        self.top = np.array([rect.top for rect in rects] + [far], dtype=np.int64)
+        self.bottom = np.array([rect.bottom for rect in rects] + [far], dtype=np.int64)
+
+        self.cell_size = cell_size
+        self.x0 = min([rect.left for rect in rects], default=0)
+        x1 = max([rect.right for rect in rects], default=1)
+        self.cell_count = max(1, (x1 - self.x0 + cell_size - 1) // cell_size)
+        cells = [[] for _ in range(self.cell_count)]
+        for index, rect in enumerate(rects):
+            first = (rect.left - self.x0) // cell_size
+            last = (max(rect.left, rect.right - 1) - self.x0) // cell_size
+            for cell in range(first, last + 1):
+                cells[cell].append(index)
+        width = max([len(cell) for cell in cells] + [1])
+        self.table = np.full((self.cell_count, width), count, dtype=np.int64)
+        for cell, indices in enumerate(cells):
+            self.table[cell, :len(indices)] = indices
+        self.sentinel = count
+
+    def candidates(self, left, right):
+        """
+        每个敌人可能碰到的线段编号
+
+        参数:
+            left, right: 敌人矩形左右边缘的数组
+        返回:
+            ndarray: 形状为 (敌人数, 候选数) 的线段编号，空位为哨兵编号
+        """
+        last = self.cell_count - 1
+        first_cell = np.clip((left - self.x0) // self.cell_size, 0, last)
+        last_cell = np.clip((np.maximum(left, right - 1) - self.x0) // self.cell_size, 0, last)
+        return np.concatenate((self.table[first_cell], self.table[last_cell]), axis=1)
+
+    def hits(self, cand, left, top, right, bottom):
+        """候选线段中与敌人矩形相交的（与 Rect.colliderect 相同）"""
+        return ((left[:, None] < self.right[cand]) & (right[:, None] > self.left[cand]) &
+                (top[:, None] < self.bottom[cand]) & (bottom[:, None] > self.top[cand]))
+
+    def first(self, cand, qualified):
+        """
+        每个敌人满足条件的候选线段中组内顺序最靠前的一条
+
+        返回:
+            (ndarray, ndarray): 是否找到、找到的线段编号
+        """
+        key = np.where(qualified, cand, self.sentinel)
+        line = key.min(axis=1)
+        return line < self.sentinel, line
+
+
+class EnemyBatch:
+    """
+    敌人的批量物理（结构数组）：所有敌人的位置、速度、方向、着陆状态、跳跃冷却等都放在NumPy数组里，
+    重力、最大下落速度、随机转向、随机跳跃、走路动画和与线段的碰撞都按数组一次算完，
+    最后把位置、矩形和当前帧图像写回各个精灵。
+
+    与 EnemyBase.update / Enemy2.update 的规则相同，只有两处简化：
+    同一帧碰到多条竖线时只处理组内顺序最靠前的一条；随机数来自NumPy，而不是 random()。
+    批量模式下敌人的状态以数组为准；每步结束时把位置、速度、方向和着陆状态写回精灵，
+    精灵上读到的这些属性（例如 replay.state_digest 读的方向）和逐个更新时一样是最新的。
+    """
+
+    def __init__(self, enemies, horizontal_lines, vertical_lines, rng=None):
+        """
+        参数:
+            enemies: 敌人精灵（EnemyBase的子类）
+            horizontal_lines, vertical_lines: 关卡的线段碰撞体组
+            rng: NumPy随机数生成器，默认新建一个
+        """
+        self.sprites = list(enemies)
+        self.horizontal_lines = horizontal_lines
+        self.vertical_lines = vertical_lines
+        self.rng = rng if rng is not None else np.random.default_rng()
+        sprites = self.sprites
+        for index, sprite in enumerate(sprites):
+            sprite.batch = self
+            sprite.batch_index = index
+
+        def column(values, dtype):
+            return np.array(list(values), dtype=dtype)
+
+        self.x = column((sprite.pos.x for sprite in sprites), np.float64)
+        self.y = column((sprite.pos.y for sprite in sprites), np.float64)
+        self.vel_x = column((sprite.vel.x for sprite in sprites), np.float64)
+        self.vel_y = column((sprite.vel.y for sprite in sprites), np.float64)
+        self.direction = column((sprite.direction for sprite in sprites), np.float64)
+        self.move_speed = column((sprite.move_speed for sprite in sprites), np.float64)
+        self.landing = column((sprite.landing for sprite in sprites), bool)
+        self.change_timer = column((sprite.change_direction_timer for sprite in sprites), np.int64)
+        self.interval = column((sprite.direction_change_interval for sprite in sprites), np.int64)
+        self.image_index = column((sprite.image_index for sprite in sprites), np.int64)
+        self.walking_timer = column((sprite.walking_timer for sprite in sprites), np.int64)
+        self.walk_frame_count = column((sprite.walk_frame_count for sprite in sprites), np.int64)
+        self.width = column((sprite.rect.width for sprite in sprites), np.int64)
+        self.height = column((sprite.rect.height for sprite in sprites), np.int64)
+        # 只有会跳的敌人（Enemy2）有这些属性，其他敌人跳跃概率为0
+        self.jumper = column((hasattr(sprite, 'jump_cooldown') for sprite in sprites), bool)
+        self.jump_probability = column((getattr(sprite, 'jump_probability', 0.0) for sprite in sprites), np.float64)
+        self.enemy_jump = column((getattr(sprite, 'enemy_jump', 0) for sprite in sprites), np.float64)
+        self.jump_cooldown = column((getattr(sprite, 'jump_cooldown', 0) for sprite in sprites), np.int64)
+
+        # 格子不小于最宽的敌人，每个敌人最多跨两个格子
+        cell_size = max([SPATIAL_CELL_SIZE] + [int(width) + 1 for width in self.width])
+        self.horizontal = LineTable(horizontal_lines, cell_size)
+        self.vertical = LineTable(vertical_lines, cell_size)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def step(self, sprites):
+        """
+        把给出的敌人推进一帧（相当于对每个敌人调用一次 update）
+
+        参数:
+            sprites: 这一帧要更新的敌人；不属于这个批次的敌人照常逐个更新
+        """
+        selected = []
+        for sprite in sprites:
+            if getattr(sprite, 'batch', None) is self:
+                selected.append(sprite.batch_index)
+            else:
+                sprite.update(self.horizontal_lines, self.vertical_lines)
+        if not selected:
+            return
+        sel = np.array(selected, dtype=np.int64)
+        now = sim_ticks()
+        rng = self.rng
+        count = len(sel)
+
+        direction = self.direction[sel]
+        move_speed = self.move_speed[sel]
+        landing = self.landing[sel]
+        vel_y = self.vel_y[sel]
+        wfc = self.walk_frame_count[sel]
+        image_index = self.image_index[sel]
+        walking_timer = self.walking_timer[sel]
+        jump_cooldown = self.jump_cooldown[sel]
+        width = self.width[sel]
+        height = self.height[sel]
+
+        # 自动移动：先按当前方向设速度，再随机决定下一帧是否转向
+        vel_x = direction * move_speed
+        change_timer = self.change_timer[sel]
+        due = now - change_timer > self.interval[sel]
+        flip = due & (rng.random(count) < 0.3)  # 30%的概率改变方向
+        direction = np.where(flip, -direction, direction)
+        change_timer = np.where(due, now, change_timer)
+
+        # 随机跳跃（只有会跳的敌人，在地面上且冷却结束时）
+        jumper = self.jumper[sel]
+        jump = jumper & landing & (rng.random(count) < self.jump_probability[sel]) & (jump_cooldown <= 0)
+        vel_y = np.where(jump, -self.enemy_jump[sel], vel_y)
+        landing = landing & ~jump
+        jump_cooldown = np.where(jump, ENEMY_JUMP_COOLDOWN,
+                                 np.where(jumper & (jump_cooldown > 0), jump_cooldown - 1, jump_cooldown))
+
+        # 走路动画（与 EnemyBase.walk 相同）
+        right = vel_x > 0
+        left = vel_x < 0
+        moving = right | left
+        start = moving & (image_index == 0)
+        advance = moving & ~start & (now - walking_timer > 130 - np.abs(vel_x) * 6)
+        image_index = image_index + (start | advance)
+        walking_timer = np.where(start | advance, now, walking_timer)
+        image_index = np.where(right & (image_index > wfc + 1), 0, image_index)
+        left_stand = wfc + 2
+        image_index = np.where(left & (image_index > left_stand * 2 - 2), left_stand, image_index)
+        image_index = np.where(left & (image_index < left_stand), left_stand, image_index)
+        image_index = np.where(moving, image_index, 0)
+        # 空中状态
+        image_index = np.where(landing, image_index, np.where(right, wfc + 1, left_stand * 2 - 1))
+
+        # 重力、最大下落速度、位置更新
+        vel_y = np.minimum(vel_y + GRAVITY, TERMINAL_VELOCITY)
+        x = self.x[sel] + vel_x
+        y = self.y[sel] + vel_y
+        half_width = width // 2
+
+        # 检测垂直线碰撞（墙壁）
+        landing = np.zeros(count, dtype=bool)
+        rect_left = round_half_away(x) - half_width
+        rect_bottom = round_half_away(y)
+        table = self.vertical
+        cand = table.candidates(rect_left, rect_left + width)
+        hit = table.hits(cand, rect_left, rect_bottom - height, rect_left + width, rect_bottom)
+        rect_right = rect_left + width
+        line_left = table.left[cand]
+        line_right = table.right[cand]
+        to_right = hit & right[:, None] & (rect_right[:, None] >= line_left) & \
+            ((rect_right - vel_x)[:, None] <= line_left)
+        to_left = hit & left[:, None] & (rect_left[:, None] <= line_right) & \
+            ((rect_left - vel_x)[:, None] >= line_right)
+        found, line = table.first(cand, to_right | to_left)
+        turn_left = found & right
+        turn_right = found & left
+        x = np.where(turn_left, table.left[line] - width / 2, x)
+        x = np.where(turn_right, table.right[line] + width / 2, x)
+        direction = np.where(turn_left, -1.0, np.where(turn_right, 1.0, direction))
+        vel_x = np.where(turn_left, -move_speed, np.where(turn_right, move_speed, vel_x))
+
+        # 检测水平线碰撞（地面/平台）
+        rect_left = round_half_away(x) - half_width
+        rect_bottom = round_half_away(y)
+        rect_top = rect_bottom - height
+        table = self.horizontal
+        cand = table.candidates(rect_left, rect_left + width)
+        hit = table.hits(cand, rect_left, rect_top, rect_left + width, rect_bottom)
+        line_top = table.top[cand]
+        line_bottom = table.bottom[cand]
+        # 从上方落到平台上
+        fall = hit & (vel_y > 0)[:, None] & (rect_bottom[:, None] > line_top) & \
+            ((rect_bottom - vel_y)[:, None] <= line_top + E_PLUS)
+        found_ground, ground = table.first(cand, fall)
+        # 从下方撞到平台底部
+        rise = hit & (vel_y < 0)[:, None] & (rect_top[:, None] < line_bottom) & \
+            ((rect_top - vel_y)[:, None] >= line_bottom)
+        found_ceiling, ceiling = table.first(cand, rise)
+        y = np.where(found_ground, table.top[ground], y)
+        y = np.where(found_ceiling, table.bottom[ceiling] + height, y)
+        vel_y = np.where(found_ground | found_ceiling, 0.0, vel_y)
+        landing = found_ground
+
+        # 写回数组
+        self.x[sel] = x
+        self.y[sel] = y
+        self.vel_x[sel] = vel_x
+        self.vel_y[sel] = vel_y
+        self.direction[sel] = direction
+        self.landing[sel] = landing
+        self.change_timer[sel] = change_timer
+        self.image_index[sel] = image_index
+        self.walking_timer[sel] = walking_timer
+        self.jump_cooldown[sel] = jump_cooldown
+
+        # 精灵从数组读取位置、速度、方向、着陆状态、矩形和图像
+        centerx = round_half_away(x)
+        bottom = round_half_away(y)
+        fallen = y > GROUND_HEIGHT + 200  # 掉出地图
+        sprites = self.sprites
+        for index, px, py, vx, vy, face, landed, cx, by, frame, out in zip(
+                selected, x.tolist(), y.tolist(), vel_x.tolist(), vel_y.tolist(), direction.tolist(),
+                landing.tolist(), centerx.tolist(), bottom.tolist(), image_index.tolist(), fallen.tolist()):
+            sprite = sprites[index]
+            sprite.pos.update(px, py)
+            sprite.vel.update(vx, vy)
+            sprite.direction = int(face)
+            sprite.landing = landed
+            sprite.rect.midbottom = (cx, by)
+            sprite.image = sprite.frames[frame]
+            if out:
+                sprite.dead = True
+                sprite.kill()
@@ -0,0 +1,200 @@
+import json  # 录像文件格式
+from tools import *  # 导入工具函数
+from settings import *  # 导入游戏设置
+
+# 马里奥每一步读取的按键，录像里按这个顺序存成一个位掩码
+WATCHED_KEYS = (pg.K_LEFT, pg.K_RIGHT, pg.K_SPACE)
+# 游戏命令键（切换关卡、重新开始），按下时在下一步开始前执行
+COMMAND_KEYS = (pg.K_1, pg.K_2, pg.K_3, pg.K_r)
+_KEY_BITS = {key: bit for bit, key in enumerate(WATCHED_KEYS)}  # 按键 -> 掩码中的位
+
+REPLAY_VERSION = 2  # 录像文件格式版本（2: 按键里去掉了R，R只作为命令键）
+
+
+class KeyState:
+    """一步的按键状态，用法同 pg.key.get_pressed() 的结果：keys[pg.K_LEFT]"""
+
+    def __init__(self, mask=0):
+        """
+        参数:
+            mask (int): 按 WATCHED_KEYS 顺序的位掩码
+        """
+        self.mask = mask
+
+    def __getitem__(self, key):
+        bit = _KEY_BITS.get(key)
+        if bit is None:
+            return False
+        return bool(self.mask >> bit & 1)
+
+    @classmethod
+    def from_keyboard(cls):
+        """读取键盘当前的状态"""
+        pressed = pg.key.get_pressed()
+        mask = 0
+        for bit, key in enumerate(WATCHED_KEYS):
+            if pressed[key]:
+                mask |= 1 << bit
+        return cls(mask)
+
+
+class KeyboardInput:
+    """
+    键盘输入：每一步开始时读一次键盘，这一步里马里奥看到的都是同一个状态
+
+    游戏命令键由 Game.events 交给 press()，在下一步开始前执行，
+    所以命令和按键状态一样都落在确定的某一步上，录像可以逐步重放。
+    """
+
+    def __init__(self):
+        self.keys = KeyState()
+        self.pending = []  # 还没执行的命令键
+        self.tick = 0      # 已经开始了多少步
+
+    def begin_tick(self):
+        """
+        开始新的一步
+
+        返回:
+            list: 这一步开始前要执行的命令键
+        """
+        self.keys = self.read_keys()
+        commands, self.pending = self.pending, []
+        self.tick += 1
+        return commands
+
+    def read_keys(self):
+        """读这一步的按键状态"""
+        return KeyState.from_keyboard()
+
+    def get_pressed(self):
+        """这一步的按键状态"""
+        return self.keys
+
+    def press(self, key):
+        """玩家按下了一个命令键"""
+        self.pending.append(key)
+
+    def finished(self):
+        """输入是否已经用完（键盘输入永远不会）"""
+        return False
+
+
+class ScriptedInput(KeyboardInput):
+    """按脚本给出每一步的按键状态，不读键盘（基准测试、快进检查用）"""
+
+    def __init__(self, script):
+        """
+        参数:
+            script: 函数，参数为第几步，返回按 WATCHED_KEYS 顺序的位掩码
+        """
+        super().__init__()
+        self.script = script
+
+    def read_keys(self):
+        return KeyState(self.script(self.tick))
+
+
+class InputRecorder(KeyboardInput):
+    """
+    录制键盘输入：每一步的按键状态和命令键都记下来，save() 写成录像文件
+
+    按键状态按游程编码保存（[位掩码, 连续步数]），手不动的时候不管多少步都只占一项。
+    """
+
+    def __init__(self, level=1, seed=None, script=None):
+        """
+        参数:
+            level: 录制开始时的关卡
+            seed (int): 游戏使用的随机种子，重放时用同一个
+            script: 同 ScriptedInput，按脚本给出按键状态；None时读键盘（检查录像能否重放时用）
+        """
+        super().__init__()
+        self.level = level
+        self.seed = seed
+        self.script = script
+        self.runs = []      # [位掩码, 连续步数]
+        self.commands = []  # [第几步, 命令键名]
+
+    def begin_tick(self):
+        commands = super().begin_tick()
+        mask = self.keys.mask
+        if self.runs and self.runs[-1][0] == mask:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([mask, 1])
+        for key in commands:
+            self.commands.append([self.tick - 1, pg.key.name(key)])
+        return commands
+
+    def read_keys(self):
+        if self.script is not None:
+            return KeyState(self.script(self.tick))
+        return super().read_keys()
+
+    def save(self, path):
+        """写出录像文件"""
+        data = {
+            'version': REPLAY_VERSION,
+            'sim_fps': SIM_FPS,
+            'level': self.level,
+            'seed': self.seed,
+            'keys': [pg.key.name(key) for key in WATCHED_KEYS],
+            'ticks': self.tick,
+            'runs': self.runs,
+            'commands': self.commands,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+
+class InputReplay:
+    """重放录像：按录制时的顺序逐步给出按键状态和命令键，键盘被忽略"""
+
+    def __init__(self, path):
+        """
+        参数:
+            path (str): InputRecorder.save() 写出的录像文件
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != REPLAY_VERSION:
+            raise ValueError(f"不支持的录像版本: {data.get('version')}")
+        if data.get('sim_fps') != SIM_FPS:
+            raise ValueError(f"录像的模拟步长 ({data.get('sim_fps')}) 与当前设置 ({SIM_FPS}) 不同")
+        if data.get('keys') != [pg.key.name(key) for key in WATCHED_KEYS]:
+            raise ValueError("录像记录的按键与当前版本不同")
+        self.level = data['level']
+        self.seed = data['seed']
+        self.ticks = data['ticks']
+        self.runs = data['runs']
+        self.commands = {}
+        for tick, name in data['commands']:
+            self.commands.setdefault(tick, []).append(pg.key.key_code(name))
+        self.keys = KeyState()
+        self.tick = 0
+        self.run_index = 0  # 当前游程
+        self.run_left = 0   # 当前游程还剩几步
+
+    def begin_tick(self):
+        if self.finished():
+            self.keys = KeyState()
+            return []
+        if self.run_left == 0:
+            mask, self.run_left = self.runs[self.run_index]
+            self.run_index += 1
+            self.keys = KeyState(mask)
+        self.run_left -= 1
+        commands = self.commands.get(self.tick, [])
+        self.tick += 1
+        return commands
+
+    def get_pressed(self):
+        return self.keys
+
+    def press(self, key):
+        """重放时忽略键盘上的命令键"""
+
+    def finished(self):
+        """录像是否已经放完"""
+        return self.tick >= self.ticks
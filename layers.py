@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from tools import *  # 导入工具函数
+from settings import *  # 导入游戏设置
+
+
+class ChunkedLayer:
+    """
+    分块图层：把一张很宽的地图图层切成和视口一样宽的块，只生成、只绘制视口附近的块
+
+    子类实现 render_chunk(index) 返回第 index 块的Surface。
+    块按需生成并转换为屏幕格式，最多保留 max_chunks 块（最近最少使用的先丢弃），
+    所以不管地图有多少屏宽，占用的内存只和可见区域有关。
+    """
+
+    def __init__(self, width, height, chunk_width=WIDTH, max_chunks=None, top=0):
+        """
+        参数:
+            width, height (int): 整个图层的尺寸（世界坐标）
+            chunk_width (int): 每块的宽度，默认等于窗口宽度
+            max_chunks (int): 最多保留的块数，默认为视口最多覆盖的块数再多两块
+            top (int): 图层上边缘在世界坐标中的y值
+        """
+        self.width = width
+        self.height = height
+        self.top = top
+        self.chunk_width = chunk_width
+        self.chunk_count = max(1, (width + chunk_width - 1) // chunk_width)
+        if max_chunks is None:
+            max_chunks = (WIDTH + chunk_width - 1) // chunk_width + 2
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()  # 块编号 -> Surface
+
+    def get_width(self):
+        """图层宽度（与Surface接口一致）"""
+        return self.width
+
+    def get_height(self):
+        """图层高度（与Surface接口一致）"""
+        return self.height
+
+    def chunk_rect(self, index):
+        """第 index 块在世界坐标中的矩形"""
+        x = index * self.chunk_width
+        return pg.Rect(x, self.top, min(self.chunk_width, self.width - x), self.height)
+
+    def render_chunk(self, index):
+        """生成第 index 块的Surface，由子类实现；这一块什么都没有时可以返回None"""
+        raise NotImplementedError
+
+    def get_chunk(self, index):
+        """取得第 index 块，没有就生成"""
+        if index not in self.chunks:
+            chunk = self.render_chunk(index)
+            self.chunks[index] = chunk
+            while len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        else:
+            chunk = self.chunks[index]
+            self.chunks.move_to_end(index)
+        return chunk
+
+    def prerender(self):
+        """一次生成所有的块并一直保留，之后绘制时不再生成、也不再丢弃"""
+        self.max_chunks = self.chunk_count
+        # 设了 RLEACCEL 的块第一次被贴出去时才编码，编码后原来的像素就释放了；
+        # 这里先贴一次，全部保留的块只占编码后的内存（压力测试关卡125块约60MB，不贴时约230MB）
+        target = pg.Surface((1, 1))
+        for index in range(self.chunk_count):
+            chunk = self.get_chunk(index)
+            if chunk is not None:
+                target.blit(chunk, (0, 0))
+
+    def visible_chunks(self, viewpoint):
+        """返回与视口重叠的块编号范围"""
+        first = max(0, viewpoint.left // self.chunk_width)
+        last = min(self.chunk_count - 1, (viewpoint.right - 1) // self.chunk_width)
+        return range(first, last + 1)
+
+    def draw(self, screen, viewpoint):
+        """
+        把视口内的部分绘制到屏幕上，等价于 screen.blit(整张图层, (0, 0), viewpoint)
+
+        返回:
+            int: 实际绘制的块数
+        """
+        count = 0
+        for index in self.visible_chunks(viewpoint):
+            chunk = self.get_chunk(index)
+            if chunk is None:
+                continue
+            x = index * self.chunk_width
+            screen.blit(chunk, (x - viewpoint.x, self.top - viewpoint.y))
+            count += 1
+        return count
+
+    def clear(self):
+        """丢弃所有已生成的块"""
+        self.chunks.clear()
+
+
+class BackgroundLayer(ChunkedLayer):
+    """背景图层：把背景图拉伸到整个地图大小，但只按块拉伸需要显示的部分"""
+
+    def __init__(self, image, width=MAP_WIDTH, height=HEIGHT, chunk_width=WIDTH):
+        """
+        参数:
+            image (Surface): 背景原图（不会被修改）
+            width, height (int): 背景拉伸后的尺寸，默认为整个地图
+            chunk_width (int): 每块的宽度
+        """
+        super().__init__(width, height, chunk_width)
+        self.image = image
+        self.scale_x = image.get_width() / width  # 地图上1像素对应原图多少像素
+
+    def render_chunk(self, index):
+        """从原图中截取这一块对应的竖条，拉伸到块大小"""
+        rect = self.chunk_rect(index)
+        # 原图上对应的范围，两边各向外取整，保证覆盖整块
+        src_left = int(rect.left * self.scale_x)
+        src_right = min(self.image.get_width(), int(rect.right * self.scale_x + 0.999999))
+        src_width = max(1, src_right - src_left)
+
+        # 把这一竖条拉伸到地图比例，再截掉两边多出来的部分
+        strip_width = max(rect.width, int(round(src_width / self.scale_x)))
+        strip = pg.transform.scale(
+            self.image.subsurface((src_left, 0, src_width, self.image.get_height())),
+            (strip_width, self.height))
+        offset = int(round(rect.left - src_left / self.scale_x))
+        offset = max(0, min(offset, strip_width - rect.width))
+
+        # 原图已经是屏幕格式，拉伸结果也是，截取后直接使用
+        if strip_width == rect.width:
+            return strip
+        return strip.subsurface((offset, 0, rect.width, self.height)).copy()
+
+
+class LevelLayer(ChunkedLayer):
+    """
+    关卡静态图层：把不会移动的精灵（地面、墙壁、水管等）合成到分块图层上
+    没有图像（image 为None）的精灵按 rect 填上它的 color，线段碰撞体不需要各自带一张Surface
+
+    建图层时按块把精灵分好组并把所有块合成好（prerender），游戏中来回滚动也不会再合成，
+    每帧只需贴一两块，和关卡里有多少水管无关。块里大部分是透明像素，RLE编码后占的内存很少，
+    所以即使是上百屏宽的关卡也可以全部保留。
+    """
+
+    def __init__(self, sprites, width=MAP_WIDTH, chunk_width=WIDTH):
+        """
+        参数:
+            sprites: 静态精灵（需要有 rect，以及 image 或 color），按给出的顺序绘制
+            width (int): 图层最小宽度，默认为地图宽度
+            chunk_width (int): 每块的宽度
+        """
+        sprites = [sprite for sprite in sprites
+                   if sprite.image is not None or getattr(sprite, 'color', None)]
+        # 图层要覆盖所有精灵，水管可能高出屏幕上边缘
+        top = min([0] + [sprite.rect.top for sprite in sprites])
+        bottom = max([HEIGHT] + [sprite.rect.bottom for sprite in sprites])
+        width = max([width] + [sprite.rect.right for sprite in sprites])
+        super().__init__(width, bottom - top, chunk_width, top=top)
+
+        # 每块涉及哪些精灵
+        self.buckets = {}
+        for sprite in sprites:
+            first = max(0, sprite.rect.left // chunk_width)
+            last = max(first, (sprite.rect.right - 1) // chunk_width)
+            for index in range(first, last + 1):
+                self.buckets.setdefault(index, []).append(sprite)
+        self.prerender()
+
+    def render_chunk(self, index):
+        """把与这一块重叠的精灵画到一张透明的Surface上"""
+        sprites = self.buckets.get(index)
+        if not sprites:
+            return None
+        rect = self.chunk_rect(index)
+        chunk = pg.Surface(rect.size, pg.SRCALPHA).convert_alpha()
+        chunk.fill((0, 0, 0, 0))
+        for sprite in sprites:
+            if sprite.image is None:
+                chunk.fill(sprite.color, sprite.rect.move(-rect.x, -rect.y))
+            else:
+                chunk.blit(sprite.image, (sprite.rect.x - rect.x, sprite.rect.y - rect.y))
+        # 块里大部分是透明像素，RLE编码后贴图时直接跳过，比逐像素混合快得多
+        chunk.set_alpha(255, pg.RLEACCEL)
+        return chunk
@@ -1,18 +1,40 @@
 from enemy import *  # 导入精灵相关的所有类和函数
 from mario import *  # 导入精灵相关的所有类和函数
 from Collider import *  # 导入精灵相关的所有类和函数
+from layers import *  # 导入分块图层
+from spatial import *  # 导入空间索引
+from enemy_batch import *  # 导入敌人批量物理
+from profiler import *  # 导入性能分析器
+from tracing import *  # 导入追踪
+from level_format import *  # 导入关卡编译缓存
 from level_data import *
 import random
 
 class Level(pg.sprite.Sprite):
     """使用线段碰撞体的关卡类"""
     
-    def __init__(self, level_data=level1_data):
+    @traced('Level.load')
+    def __init__(self, level_data=level1_data, seed=None):
         """初始化关卡，设置所有游戏元素
         
         参数:
-            level_data: 关卡数据字典，如果为None则使用默认关卡1
+            level_data: 关卡数据字典、JSON关卡文件路径或编译好的 CompiledLevel
+            seed (int): 随机种子，None时使用关卡数据里的 'seed'，没有就用 RANDOM_SEED
         """
+        # 开启编译缓存时先取得编译好的关卡（JSON文件和编译好的关卡只能走这条路）
+        compiled = None
+        if COMPILED_LEVELS or not isinstance(level_data, dict):
+            compiled = load_level(level_data)
+        
+        # 关卡自己的随机数流：水管颜色、敌人转向和跳跃都从这里取，同样的种子和输入每次运行结果都一样
+        # 两条路径同一个规则：关卡数据没有种子（或为None）时都用 RANDOM_SEED
+        if seed is None:
+            seed = compiled.seed if compiled is not None else level_data.get('seed')
+        if seed is None:
+            seed = RANDOM_SEED
+        self.seed = seed
+        self.rng = random.Random(seed)
+        
         # 初始化碰撞体组
         self.collision_distance=PIPE_DISTANCE
                             # 当马里奥距离水管边缘x像素时就触发碰撞
@@ -30,7 +52,10 @@ class Level(pg.sprite.Sprite):
         # else:
             # self.set_level(level_data)
             
-        self.set_level(level_data)
+        if compiled is not None:
+            self.set_compiled_level(compiled)
+        else:
+            self.set_level(level_data)
             
         # self.set_group()      # 组合所有碰撞体组
         # self.set_mario()      # 创建马里奥角色
@@ -102,6 +127,8 @@ class Level(pg.sprite.Sprite):
         for pipe in level_data.get('pipe', []):
             self.set_pipe(pipe)
             
+        self.set_width()
+        
         #设置enemy
         self.set_enemies(level_data)
         mario_data=level_data.get('mario', [])
@@ -109,6 +136,60 @@ class Level(pg.sprite.Sprite):
 
         self.set_group()      # 组合所有碰撞体组
 
+    def set_compiled_level(self, compiled):
+        """
+        用编译好的关卡设置关卡：线段、水管内部矩形和敌人直接从扁平数组创建，
+        创建顺序和 set_level 一样，所以碰撞检测、随机数的结果也一样
+        """
+        self.horizontal_lines.empty()
+        self.vertical_lines.empty()
+        self.pipe_inner_colliders.empty()
+        
+        # 随机颜色在这里按水管顺序取，和 create_pipe 取随机数的顺序一致
+        colors = compiled.colors(self.rng) + [None]  # 下标 NO_COLOR (-1) 取到 None
+        
+        horizontal = compiled.horizontal
+        for i in range(0, len(horizontal), 4):
+            x, y, length, color = horizontal[i:i + 4]
+            self.horizontal_lines.add(LineCollider(x, y, length, 'horizontal', color=colors[color]))
+        
+        vertical = compiled.vertical
+        for i in range(0, len(vertical), 5):
+            x, y, length, color, pipe_edge = vertical[i:i + 5]
+            line = LineCollider(x, y, length, 'vertical', color=colors[color])
+            if pipe_edge:
+                line.is_pipe_edge = True  # 标记为水管边缘
+            self.vertical_lines.add(line)
+        
+        inner = compiled.inner
+        for i in range(0, len(inner), 4):
+            self.pipe_inner_colliders.add(PipeInnerCollider(*inner[i:i + 4]))
+        self.set_width()
+        
+        # 敌人按生成表创建
+        self.enemies = pg.sprite.Group()
+        kinds = compiled.enemy_kinds
+        positions = compiled.enemy_positions
+        for i in range(len(kinds) // 3):
+            kind, scaled_w, scaled_h = kinds[i * 3:i * 3 + 3]
+            self.set_enemy((kind, (positions[i * 2], positions[i * 2 + 1]), scaled_w, scaled_h))
+        self.set_enemy_groups()
+        
+        self.set_mario(compiled.mario)
+        self.set_group()
+
+    def set_width(self):
+        """
+        地图宽度：取右侧墙壁的位置，没有墙壁时取地面的最右端；都没有时为 MAP_WIDTH
+        手写关卡都是 MAP_WIDTH 宽，生成的关卡按屏数可以宽得多
+        """
+        walls = [line.rect.right for line in self.vertical_lines
+                 if not getattr(line, 'is_pipe_edge', False)]
+        if walls:
+            self.width = max(walls)
+        else:
+            self.width = max((line.rect.right for line in self.horizontal_lines), default=MAP_WIDTH)
+
     def set_ground(self, ground_data):
         """设置地面碰撞体
         
@@ -143,11 +224,16 @@ class Level(pg.sprite.Sprite):
             x, y, width, height, color = pipe_data[:5]
             self.create_pipe(x, y, width, height, color)
 
+    @traced()
     def update(self):
         """每帧更新关卡状态"""
         # 更新所有敌人
-        for enemy in self.enemies:
-            enemy.update(self.horizontal_lines, self.vertical_lines)
+        if self.enemy_batch is not None:
+            self.enemy_batch.step(self.enemies)
+        else:
+            for enemy in self.enemies:
+                enemy.update(self.horizontal_lines, self.vertical_lines)
+        profiler.lap('update')
         
         # 更新马里奥
         self.check_collide()  # 检测碰撞
@@ -156,6 +242,7 @@ class Level(pg.sprite.Sprite):
         
         # 检查马里奥与敌人的碰撞
         self.check_enemy_collisions()
+        profiler.lap('collision')
 
     def set_mario(self,mario_data):
         """创建马里奥角色实例"""
@@ -168,9 +255,19 @@ class Level(pg.sprite.Sprite):
         
         for enemy in level_data.get('enemy', []):
             self.set_enemy(enemy)
+        self.set_enemy_groups()
+
+    def set_enemy_groups(self):
+        """敌人都创建好以后，设置随机数流、碰撞检测用的组和粗筛"""
+        # 敌人共用关卡的随机数流
+        for enemy in self.enemies:
+            enemy.rng = self.rng
         
         # 创建所有敌人的组（用于碰撞检测）
         self.all_enemies = pg.sprite.Group(self.enemies)
+        
+        # 按x坐标排序的粗筛，接触检测时只取出x区间重叠的敌人
+        self.contacts = SweepAndPrune(self.all_enemies)
     
     def set_enemy(self, enemy_data):
         if(enemy_data[0]==1):
@@ -193,10 +290,14 @@ class Level(pg.sprite.Sprite):
             # enemy_type2.set_scale(enemy_data[2],enemy_data[3])
             self.enemies.add(the_princess)
         
+    @traced()
     def check_enemy_collisions(self):
         """检测马里奥与敌人的碰撞"""
-        # 创建一个临时列表，避免在遍历时修改
-        enemies_to_check = list(self.all_enemies.sprites())
+        # 敌人都移动完了，重新排序后只取出和马里奥x区间重叠的（按组内顺序）
+        # 得到的是一个临时列表，避免在遍历时修改
+        self.contacts.sync(self.all_enemies)
+        self.contacts.update()
+        enemies_to_check = self.contacts.query(self.mario.rect)
         
         for enemy in enemies_to_check:
             # 检查马里奥是否与敌人碰撞
@@ -237,6 +338,7 @@ class Level(pg.sprite.Sprite):
             self.enemies.remove(enemy)
         if enemy in self.all_enemies:
             self.all_enemies.remove(enemy)
+        self.contacts.remove(enemy)
 
     def create_pipe(self, x, y, width, height, color=None):
         """
@@ -249,7 +351,7 @@ class Level(pg.sprite.Sprite):
             color: 水管颜色，默认为随机颜色
         """
         if color is None:
-            color = (random.randint(50, 200), random.randint(50, 200), random.randint(50, 200))
+            color = (self.rng.randint(50, 200), self.rng.randint(50, 200), self.rng.randint(50, 200))
         
         # 计算水管顶部位置（y坐标从地面向上）
         pipe_top_y = y - height
@@ -305,64 +407,72 @@ class Level(pg.sprite.Sprite):
         
         # 添加水管内部碰撞体组
         self.all_colliders.add(*self.pipe_inner_colliders)
+        
+        # 需要绘制的碰撞体：有图像的贴图像，没有Surface但有颜色的（COLLIDER_SURFACES为False时的线段）
+        # 由静态图层按矩形填色；既没有图像也没有颜色的碰撞体是透明的，只参与碰撞检测
+        self.visible_colliders = pg.sprite.Group(
+            *(collider for collider in self.all_colliders
+              if collider.image is not None or getattr(collider, 'color', None)))
+        
+        # 碰撞体都不会移动，合成为一张分块的静态图层，像背景一样绘制
+        self.static_layer = LevelLayer(self.visible_colliders, self.width)
+        
+        # 同样因为不会移动，碰撞检测用的空间索引也只需建一次
+        self.set_terrain_index()
 
-    def check_collide(self):
-        """检测马里奥与所有线段碰撞体的碰撞"""
-        self.horizontal_collisions = pg.sprite.spritecollide(self.mario, self.horizontal_lines, False)
+    def set_terrain_index(self):
+        """
+        把所有碰撞体登记到静态的地形索引里，马里奥和敌人碰撞检测时只取自己附近的
         
-        # 自定义垂直碰撞检测，为水管边缘的线使用更大的检测范围
-        self.vertical_collisions = []
+        水管边缘的扩展检测区域、水管内部的实际碰撞矩形也在这里一次算好，
+        每帧不再复制矩形、不再调用hasattr。
+        """
+        self.terrain = TerrainIndex()
+        
+        # 按组内顺序登记，查询结果的顺序和原来遍历组的顺序一致
+        for line in self.horizontal_lines:
+            self.terrain.add(line, 'horizontal')
+            
         for line in self.vertical_lines:
-            # 检查这条线是否是水管边缘
             if hasattr(line, 'is_pipe_edge') and line.is_pipe_edge:
-                # 为水管边缘的线创建一个扩展的碰撞检测区域
+                # 为水管边缘的线创建一个扩展的碰撞检测区域，左右各扩展collision_distance像素
                 expanded_rect = line.rect.copy()
-                
-                
-                
-                
-                # 左右各扩展3像素，总共增加6像素的检测范围
                 expanded_rect.x -= self.collision_distance
                 expanded_rect.width += self.collision_distance*2
-                #未知功能,待处理
-                
-                
-                
-                # 如果马里奥与扩展区域碰撞，则添加到碰撞列表中
-                if self.mario.rect.colliderect(expanded_rect):
-                    self.vertical_collisions.append(line)
+                self.terrain.add(line, 'vertical', expanded_rect)
             else:
-                # 对于普通垂直线，使用默认碰撞检测
-                if self.mario.rect.colliderect(line.rect):
-                    self.vertical_collisions.append(line)
-        
-        
-        
-        
-        
-        
-        
-        
-        # 检测水管内部碰撞体的碰撞
-        # self.pipe_inner_collisions = pg.sprite.spritecollide(self.mario, self.pipe_inner_colliders, False)
-        
-         # 检测水管内部碰撞体的碰撞
-        self.pipe_inner_collisions = []
+                self.terrain.add(line, 'vertical')
+                
         for collider in self.pipe_inner_colliders:
             # 使用实际的碰撞矩形而不是显示矩形
             if hasattr(collider, 'get_collision_rect'):
-                collision_rect = collider.get_collision_rect()
+                self.terrain.add(collider, 'pipe_inner', collider.get_collision_rect())
             else:
-                collision_rect = collider.rect
-                
-            if self.mario.rect.colliderect(collision_rect):
-                self.pipe_inner_collisions.append(collider)
-        
-        
-        
-        
-        
+                self.terrain.add(collider, 'pipe_inner')
         
+        # 敌人共用同一个地形索引
+        for enemy in self.enemies:
+            enemy.terrain = self.terrain
+
+        self.set_enemy_batch()
+
+    def set_enemy_batch(self):
+        """开启批量物理且安装了NumPy时，把走路的敌人放进NumPy数组里一起更新"""
+        self.enemy_batch = None
+        if BATCHED_ENEMY_PHYSICS and batch_available():
+            walkers = [enemy for enemy in self.enemies if isinstance(enemy, (Enemy1, Enemy2))]
+            # NumPy的随机数流也由关卡的随机数流派生
+            rng = np.random.default_rng(self.rng.getrandbits(64))
+            self.enemy_batch = EnemyBatch(walkers, self.horizontal_lines, self.vertical_lines, rng)
+
+    @traced()
+    def check_collide(self):
+        """检测马里奥与附近线段碰撞体的碰撞"""
+        # 地形索引只检查马里奥附近的碰撞体
+        collisions = self.terrain.collide(self.mario.rect)
+        self.horizontal_collisions = collisions['horizontal']
+        self.vertical_collisions = collisions['vertical']  # 水管边缘的线使用更大的检测范围
+        self.pipe_inner_collisions = collisions['pipe_inner']  # 水管内部碰撞体使用实际的碰撞矩形
         
         self.on_ground = False
         for line in self.horizontal_collisions:
@@ -373,6 +483,7 @@ class Level(pg.sprite.Sprite):
                 self.ground_line = line  # 记录站在哪条线上
                 break
 
+    @traced()
     def adjust_collisions(self):
         """处理所有碰撞"""
         # 先假设马里奥没有站在任何物体上
@@ -496,10 +607,11 @@ class Level(pg.sprite.Sprite):
                         self.mario.pos.x = line.rect.right + self.mario.rect.width/2
                         self.mario.vel.x = 0
 
+    @traced()
     def check_dead(self):
         """检查马里奥是否死亡"""
         if self.mario.pos.y > GROUND_HEIGHT + 50:
             self.mario.dead = True
         # 同时检查是否走出地图右边界
-        if self.mario.pos.x > MAP_WIDTH + 20:
+        if self.mario.pos.x > self.width + 20:
             self.mario.dead = True
\ No newline at end of file
@@ -5,11 +5,30 @@ INNER_MARGIN=(-1,6)#(x,y)
 PIPE_DISTANCE=1
                             # 当马里奥距离水管边缘x像素时就触发碰撞
 BACKGROUND='background2.jpg'
+END_BACKGROUND='final.png'      # 结束画面背景
+RESTART_BUTTON='restart.png'    # 重新开始按钮
+EXIT_BUTTON='exit.png'          # 退出按钮
+
+# 启动时在后台预加载的图像：(文件名, 像素格式)，像素格式同 tools.load_image
+PRELOAD_IMAGES = [
+    (BACKGROUND, 'convert'),
+    (END_BACKGROUND, 'convert'),
+    (RESTART_BUTTON, 'alpha'),
+    (EXIT_BUTTON, 'alpha'),
+    ('mario21.png', 'alpha'),   # 马里奥和敌人2
+    ('enemy2.png', 'alpha'),    # 敌人1
+    ('coin.png', 'alpha'),      # 金币
+    ('1.jpg', 'alpha'),         # 水管内部贴图
+]
 
 E_PLUS=5# 5像素范围内都视为碰撞,如果没有跳跃可以设置为0，enemy的
 
 ENEMY_JUMP=16 #如果这个值太小,上面的E_PLUS可能需要再改,15时plus可以=0
 
+# 敌人2的跳跃冷却（模拟步数），按 SIM_STEP_MS 换算，改变 SIM_FPS 时冷却的实际时长不变
+ENEMY_JUMP_COOLDOWN = round(500 / SIM_STEP_MS)        # 跳跃后约500毫秒内不再跳
+ENEMY_INITIAL_JUMP_COOLDOWN = round(160 / SIM_STEP_MS)  # 刚生成时约160毫秒内不跳
+
 M_PLUS=10# 5像素范围内都视为碰撞，马里奥的
 
 # 关卡1数据（现有）
@@ -0,0 +1,359 @@
+# 关卡文件格式和编译缓存
+# 关卡源数据可以是 level_data.py 里的字典，也可以是JSON源文件（格式相同，另加 'version'）。
+# 第一次加载时校验一次，把地面、墙壁、水管展开成线段和水管内部矩形，敌人展开成生成表，
+# 存成扁平数组的二进制缓存（resources/cache/levels/，文件名为源数据内容的哈希）；
+# 以后同样内容的关卡直接读数组，不再逐条解释关卡数据。源数据改了哈希就变，旧缓存自然不再使用。
+#
+# 用法:
+#   python level_format.py                    校验并编译关卡1~3，打印规模
+#   python level_format.py a.json b.json      校验并编译JSON关卡文件
+#   python level_format.py --export 目录      把关卡1~3写成JSON源文件
+import os
+import sys
+import json
+import struct
+import hashlib
+from array import array
+
+from settings import *
+from level_data import *
+
+LEVEL_FORMAT_VERSION = 1  # 源文件和编译缓存的格式版本，编译逻辑改动后加1，旧缓存自动作废
+_MAGIC = b'MLVL'
+# 缓存文件头：标识、版本、内容哈希、是否有种子、种子、马里奥位置、各个数组的长度
+_HEADER = struct.Struct('<4sH32s?qdd6I')
+SEED_RANGE = (-2 ** 63, 2 ** 63 - 1)  # 种子在文件头里存成64位有符号整数，只能在这个范围内
+
+RANDOM_COLOR = -1  # 调色板里红色分量为这个值时，表示建关卡时从关卡的随机数流取颜色
+NO_COLOR = -1      # 线段的颜色下标为这个值时，表示没有颜色（透明）
+ENEMY_KINDS = (1, 2, 0, -1)  # 敌人1、敌人2、金币、公主
+
+# 内容哈希 -> CompiledLevel，同一次运行里切换关卡不再读文件
+_compiled_levels = {}
+
+
+class CompiledLevel:
+    """
+    编译好的关卡：所有数据都是扁平数组，按 Level 建碰撞体、生成敌人的顺序排列
+
+    数组（每条记录的字段依次排列）:
+        palette:    调色板 (r, g, b)，r为 RANDOM_COLOR 时从随机数流取颜色
+        horizontal: 水平线段 (x, y, 长度, 颜色下标)
+        vertical:   垂直线段 (x, y, 长度, 颜色下标, 是否水管边缘)
+        inner:      水管内部碰撞体 (x, y, 宽, 高)
+        enemy_kinds:     敌人 (类型, 缩放宽, 缩放高)
+        enemy_positions: 敌人生成位置 (x, y)
+    """
+
+    def __init__(self, digest, seed, mario, palette, horizontal, vertical, inner, enemy_kinds, enemy_positions):
+        self.digest = digest  # 源数据内容的哈希（32字节）
+        self.seed = seed      # 关卡数据里的随机种子，没有时为None
+        self.mario = mario    # 马里奥初始位置 (x, y)
+        self.palette = palette
+        self.horizontal = horizontal
+        self.vertical = vertical
+        self.inner = inner
+        self.enemy_kinds = enemy_kinds
+        self.enemy_positions = enemy_positions
+
+    def colors(self, rng):
+        """
+        调色板里的颜色，随机颜色按顺序从 rng 取（和逐条创建水管时取随机数的顺序一样）
+
+        返回:
+            list: 颜色元组
+        """
+        palette = self.palette
+        colors = []
+        for i in range(0, len(palette), 3):
+            if palette[i] == RANDOM_COLOR:
+                colors.append((rng.randint(50, 200), rng.randint(50, 200), rng.randint(50, 200)))
+            else:
+                colors.append((palette[i], palette[i + 1], palette[i + 2]))
+        return colors
+
+    def tables(self):
+        return (self.palette, self.horizontal, self.vertical, self.inner, self.enemy_kinds, self.enemy_positions)
+
+    def to_bytes(self):
+        """写成缓存文件的内容"""
+        seed = self.seed if self.seed is not None else 0
+        header = _HEADER.pack(_MAGIC, LEVEL_FORMAT_VERSION, self.digest, self.seed is not None, seed,
+                              self.mario[0], self.mario[1], *(len(table) for table in self.tables()))
+        parts = [header]
+        for table in self.tables():
+            if sys.byteorder != 'little':
+                table = array(table.typecode, table)
+                table.byteswap()
+            parts.append(table.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, digest):
+        """
+        读取缓存文件的内容
+
+        返回:
+            CompiledLevel: 文件不完整、版本或哈希不符时返回None
+        """
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, file_digest, has_seed, seed, mario_x, mario_y, *lengths = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != LEVEL_FORMAT_VERSION or file_digest != digest:
+            return None
+        tables = []
+        offset = _HEADER.size
+        for typecode, length in zip('iiiiid', lengths):
+            table = array(typecode)
+            size = length * table.itemsize
+            if offset + size > len(data):
+                return None
+            table.frombytes(data[offset:offset + size])
+            if sys.byteorder != 'little':
+                table.byteswap()
+            tables.append(table)
+            offset += size
+        if offset != len(data):
+            return None
+        return cls(digest, seed if has_seed else None, (mario_x, mario_y), *tables)
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{where}: 应为数字，实际为 {value!r}")
+    return value
+
+
+def _integer(value, where):
+    """碰撞体的坐标和尺寸最终都是整数像素，接受整数或整数值的浮点数"""
+    value = _number(value, where)
+    if value != int(value):
+        raise ValueError(f"{where}: 应为整数，实际为 {value!r}")
+    return int(value)
+
+
+def _color(value, where):
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        raise ValueError(f"{where}: 颜色应为 (r, g, b)，实际为 {value!r}")
+    color = tuple(_integer(component, where) for component in value)
+    if not all(0 <= component <= 255 for component in color):
+        raise ValueError(f"{where}: 颜色分量应在 0~255 之间，实际为 {value!r}")
+    return color
+
+
+def _entry(entry, length, where):
+    if not isinstance(entry, (list, tuple)) or len(entry) < length:
+        raise ValueError(f"{where}: 应至少有 {length} 项，实际为 {entry!r}")
+    return entry
+
+
+def content_digest(level_data):
+    """关卡源数据内容的哈希，同样内容的字典和JSON文件得到同样的哈希"""
+    try:
+        text = json.dumps(level_data, sort_keys=True, separators=(',', ':'))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"关卡数据不能写成JSON: {e}")
+    # 编译结果还取决于格式版本和水管内部的边距
+    text += f"|{LEVEL_FORMAT_VERSION}|{INNER_MARGIN}"
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def compile_level(level_data, digest=None):
+    """
+    校验关卡源数据并编译成扁平数组
+
+    参数:
+        level_data (dict): 关卡数据，格式同 level_data.py
+        digest (bytes): 内容哈希，None时现算
+
+    返回:
+        CompiledLevel
+    """
+    if not isinstance(level_data, dict):
+        raise ValueError(f"关卡数据应为字典，实际为 {type(level_data).__name__}")
+    version = level_data.get('version', LEVEL_FORMAT_VERSION)
+    if version != LEVEL_FORMAT_VERSION:
+        raise ValueError(f"不支持的关卡格式版本: {version}")
+    if digest is None:
+        digest = content_digest(level_data)
+
+    palette = array('i')
+    palette_index = {}
+
+    def color_index(color, random_color=False):
+        """颜色在调色板里的下标；随机颜色每次都占一个新位置"""
+        if random_color:
+            palette.extend((RANDOM_COLOR, 0, 0))
+            return len(palette) // 3 - 1
+        if color is None:
+            return NO_COLOR
+        if color not in palette_index:
+            palette_index[color] = len(palette) // 3
+            palette.extend(color)
+        return palette_index[color]
+
+    horizontal = array('i')
+    vertical = array('i')
+    inner = array('i')
+
+    for i, ground in enumerate(level_data.get('ground', [])):
+        where = f"ground[{i}]"
+        x, y, length, color = _entry(ground, 4, where)[:4]
+        horizontal.extend((_integer(x, where), _integer(y, where), _integer(length, where),
+                           color_index(_color(color, where))))
+
+    for i, wall in enumerate(level_data.get('wall', [])):
+        where = f"wall[{i}]"
+        x, y, length, color = _entry(wall, 4, where)[:4]
+        vertical.extend((_integer(x, where), _integer(y, where), _integer(length, where),
+                         color_index(_color(color, where)), 0))
+
+    # 水管展开成上下两条水平线、左右两条水管边缘和内部矩形（同 Level.create_pipe）
+    inner_marginx, inner_marginy = INNER_MARGIN
+    for i, pipe in enumerate(level_data.get('pipe', [])):
+        where = f"pipe[{i}]"
+        x, y, width, height, color = _entry(pipe, 5, where)[:5]
+        x, y, width, height = (_integer(value, where) for value in (x, y, width, height))
+        color = color_index(_color(color, where), random_color=color is None)
+        top = y - height
+        horizontal.extend((x, top, width, color, x, top + height, width, color))
+        vertical.extend((x, top, height, color, 1, x + width - 1, top, height, color, 1))
+        inner.extend((x + inner_marginx, top + inner_marginy,
+                      max(1, width - 2 * inner_marginx), max(1, height - 2 * inner_marginy)))
+
+    enemy_kinds = array('i')
+    enemy_positions = array('d')
+    for i, enemy in enumerate(level_data.get('enemy', [])):
+        where = f"enemy[{i}]"
+        kind, pos, scaled_w, scaled_h = _entry(enemy, 4, where)[:4]
+        kind = _integer(kind, where)
+        if kind not in ENEMY_KINDS:
+            raise ValueError(f"{where}: 未知的敌人类型 {kind!r}，可选: {list(ENEMY_KINDS)}")
+        pos = _entry(pos, 2, where)
+        enemy_kinds.extend((kind, _integer(scaled_w, where), _integer(scaled_h, where)))
+        enemy_positions.extend((_number(pos[0], where), _number(pos[1], where)))
+
+    mario = _entry(level_data.get('mario'), 2, 'mario')
+    mario = (_number(mario[0], 'mario'), _number(mario[1], 'mario'))
+
+    seed = level_data.get('seed')
+    if seed is not None:
+        seed = _integer(seed, 'seed')
+        if not SEED_RANGE[0] <= seed <= SEED_RANGE[1]:
+            raise ValueError(f"seed: 应在 {SEED_RANGE[0]}~{SEED_RANGE[1]} 之间，实际为 {seed!r}")
+
+    return CompiledLevel(digest, seed, mario, palette, horizontal, vertical, inner, enemy_kinds, enemy_positions)
+
+
+def cache_path(digest):
+    """编译缓存文件的完整路径（位于 resources/cache/levels/）"""
+    src = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(src, 'resources', 'cache', 'levels', digest.hex()[:32] + '.lvl')
+
+
+def prune_cache(folder, keep=LEVEL_CACHE_MAX_FILES):
+    """
+    缓存文件超过 keep 个时删除最久没用过的（按修改时间，读到缓存时会更新它）
+
+    每个新种子的生成关卡都会写一个缓存文件，不清理的话快进测试、基准测试跑多了目录会无限增长。
+    """
+    try:
+        names = [name for name in os.listdir(folder) if name.endswith('.lvl')]
+    except OSError:
+        return
+    if len(names) <= keep:
+        return
+    paths = [os.path.join(folder, name) for name in names]
+    paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+    for path in paths[:len(paths) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_level_source(path):
+    """读取JSON关卡源文件"""
+    with open(path, encoding='utf-8') as f:
+        try:
+            level_data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: 不是有效的JSON: {e}")
+    if not isinstance(level_data, dict) or 'version' not in level_data:
+        raise ValueError(f"{path}: 缺少格式版本 'version'")
+    return level_data
+
+
+def save_level_source(level_data, path):
+    """把关卡数据写成JSON源文件（先校验，写出的文件一定能加载）"""
+    compile_level(level_data)
+    data = dict(level_data)
+    data['version'] = LEVEL_FORMAT_VERSION
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def load_level(source):
+    """
+    加载编译好的关卡，没有缓存或缓存失效时校验、编译并写缓存
+
+    参数:
+        source: 关卡数据字典、JSON源文件路径或已经编译好的 CompiledLevel
+
+    返回:
+        CompiledLevel
+    """
+    if isinstance(source, CompiledLevel):
+        return source
+    if isinstance(source, str):
+        source = load_level_source(source)
+    source = {key: value for key, value in source.items() if key != 'version'}
+    digest = content_digest(source)
+
+    compiled = _compiled_levels.get(digest)
+    if compiled is not None:
+        return compiled
+
+    path = cache_path(digest)
+    try:
+        with open(path, 'rb') as f:
+            compiled = CompiledLevel.from_bytes(f.read(), digest)
+        if compiled is not None:
+            os.utime(path)  # 记下最近用过，清理缓存时留下
+    except OSError:
+        compiled = None
+
+    if compiled is None:
+        compiled = compile_level(source, digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(compiled.to_bytes())
+        except OSError as e:
+            print(f"警告: 无法写入关卡缓存 {path}，错误: {e}")
+        prune_cache(os.path.dirname(path))
+
+    _compiled_levels[digest] = compiled
+    return compiled
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    builtin = {'level1': level1_data, 'level2': level2_data, 'level3': level3_data}
+    if args[:1] == ['--export']:
+        folder = args[1] if len(args) > 1 else '.'
+        os.makedirs(folder, exist_ok=True)
+        for name, level_data in builtin.items():
+            path = os.path.join(folder, name + '.json')
+            save_level_source(level_data, path)
+            print(f"已写出 {path}")
+        sys.exit(0)
+
+    sources = {path: path for path in args} or builtin
+    for name, source in sources.items():
+        compiled = load_level(source)
+        print(f"{name}: {len(compiled.horizontal) // 4} 条水平线, {len(compiled.vertical) // 5} 条垂直线, "
+              f"{len(compiled.inner) // 4} 个水管内部, {len(compiled.enemy_kinds) // 3} 个敌人, "
+              f"缓存 {cache_path(compiled.digest)}")
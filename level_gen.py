@@ -0,0 +1,196 @@
+# 压力测试关卡生成器
+# 按参数生成和 level_data.py 里格式相同的关卡数据（ground/wall/pipe/enemy/mario），
+# 地图宽度、水管密度、平台层数和各类敌人数量都可以调，同样的种子每次生成的关卡都一样。
+# 用来把关卡推到上万条线段、几千个敌人，测试碰撞、空间索引和批量物理的扩展性。
+#
+# 用法:
+#   python level_gen.py                                  默认参数，打印关卡规模
+#   python level_gen.py --screens 200 --pipes 8 --layers 3 --enemy1 1000 --enemy2 1000 --coins 500
+#   python level_gen.py --seed 7 --out stress.json       同时把关卡写成JSON关卡文件（见 level_format.py）
+import sys
+import random
+import bisect
+
+from settings import *
+
+PLATFORM_LAYER_GAP = 150  # 相邻两层平台（包括地面）之间的高度
+PLATFORM_HEIGHT = 10      # 平台的厚度（和关卡2里的薄平台一样）
+MIN_SLOT_WIDTH = 60       # 每根水管、每块平台至少占多宽的位置，密度太大时报错
+SPAWN_DROP = 20           # 敌人生成在落脚面上方多高的位置，落下来站稳
+PRINCESS_MARGIN = 400     # 公主离地图右端的距离（同手写关卡）
+
+# 压力测试关卡的参数：约1万条线段、2500个敌人（bench.py 和 soak.py 的 stress 关卡都用它）
+STRESS_LEVEL = dict(screens=125, pipes_per_screen=8, platform_layers=3, platforms_per_screen=4,
+                    enemies={1: 1000, 2: 1000, 0: 500})
+
+# 各类敌人可选的尺寸（取自手写关卡），尺寸种类少，同尺寸的敌人共用一组动画帧
+ENEMY_SIZES = {
+    1: [(80, 160), (90, 170)],
+    2: [(200, 200), (220, 220), (240, 240)],
+    0: [(20, 20), (30, 30), (40, 40)],
+}
+
+
+def max_platform_layers():
+    """地面以上最多能放几层平台（最高一层的顶部不能超出屏幕）"""
+    return (GROUND_HEIGHT - PLATFORM_HEIGHT) // PLATFORM_LAYER_GAP
+
+
+def _random_color(rng):
+    return (rng.randint(50, 200), rng.randint(50, 200), rng.randint(50, 200))
+
+
+def _place_in_slots(rng, start, end, per_screen, min_width, max_width):
+    """
+    把 [start, end) 分成等宽的格子，每格放一个宽度随机的物体，物体之间不会重叠
+
+    返回:
+        list: [(x, 宽度), ...]，按x排序
+    """
+    if per_screen <= 0 or end <= start:
+        return []
+    slot = WIDTH / per_screen
+    if slot < MIN_SLOT_WIDTH:
+        raise ValueError(f"每屏最多 {WIDTH // MIN_SLOT_WIDTH} 个，当前为 {per_screen}")
+    placed = []
+    for i in range(int((end - start) / slot)):
+        left = start + i * slot
+        upper = min(max_width, int(slot) - 10)  # 格子比最小宽度还窄时就占满格子
+        width = rng.randint(min(min_width, upper), upper)
+        x = int(left + rng.uniform(0, slot - width - 5))
+        placed.append((x, width))
+    return placed
+
+
+def generate_level(screens=20, pipes_per_screen=4, platform_layers=2, platforms_per_screen=2,
+                   enemies=None, seed=0, safe_width=WIDTH):
+    """
+    生成一个关卡
+
+    参数:
+        screens (int): 地图宽度（屏数）
+        pipes_per_screen (float): 地面上每屏放几根水管
+        platform_layers (int): 地面以上有几层平台，最多 max_platform_layers() 层
+        platforms_per_screen (float): 每层每屏放几块平台
+        enemies (dict): 敌人类型 -> 数量，类型同关卡数据（1、2为敌人，0为金币），
+            None时为 {1: 50, 2: 50, 0: 50}；公主总是放在地图右端
+        seed (int): 随机种子，同时写进关卡数据，关卡运行时的随机数也由它决定
+        safe_width (int): 马里奥右边多宽的范围内不放水管和敌人，开局不会马上碰到
+
+    返回:
+        dict: 关卡数据，格式同 level_data.py 里的关卡
+    """
+    if enemies is None:
+        enemies = {1: 50, 2: 50, 0: 50}
+    unknown = [kind for kind in enemies if kind not in ENEMY_SIZES]
+    if unknown:
+        raise ValueError(f"未知的敌人类型: {unknown}，可选: {list(ENEMY_SIZES)}")
+    if not 0 <= platform_layers <= max_platform_layers():
+        raise ValueError(f"平台层数应在 0~{max_platform_layers()} 之间，当前为 {platform_layers}")
+
+    rng = random.Random(seed)
+    width = int(screens * WIDTH)
+    mario = [WIDTH * 0.5, GROUND_HEIGHT - 70]
+    start = int(mario[0] + safe_width)       # 安全区以右才放东西
+    end = width - PRINCESS_MARGIN - 100      # 公主前面留出空地
+
+    # 地面上的水管，有平台时不能高过第一层平台
+    max_pipe_height = PLATFORM_LAYER_GAP - 40 if platform_layers else 300
+    pipes = [[x, GROUND_HEIGHT, pipe_width, rng.randint(40, max_pipe_height), _random_color(rng)]
+             for x, pipe_width in _place_in_slots(rng, start, end, pipes_per_screen, 40, 120)]
+
+    # 各层平台（底部在 y，厚度 PLATFORM_HEIGHT）
+    layers = []
+    for layer in range(platform_layers):
+        y = GROUND_HEIGHT - PLATFORM_LAYER_GAP * (layer + 1)
+        color = _random_color(rng)
+        layers.append([[x, y, platform_width, PLATFORM_HEIGHT, color]
+                       for x, platform_width in _place_in_slots(rng, start, end, platforms_per_screen, 80, 300)])
+
+    # 敌人：随机选一个落脚面（地面或某层平台），生成在它上方一点
+    pipe_lefts = [pipe[0] for pipe in pipes]
+
+    def ground_top(x):
+        """x处地面上的落脚高度，x在某根水管上方时为水管顶部"""
+        index = bisect.bisect_right(pipe_lefts, x) - 1
+        if index >= 0 and x < pipes[index][0] + pipes[index][2]:
+            return pipes[index][1] - pipes[index][3]
+        return GROUND_HEIGHT
+
+    enemy_data = []
+    for kind, count in enemies.items():
+        for _ in range(count):
+            size = rng.choice(ENEMY_SIZES[kind])
+            surface = rng.randrange(len(layers) + 1)
+            if surface and layers[surface - 1]:
+                x, y, platform_width, _, _ = rng.choice(layers[surface - 1])
+                x = rng.randint(x, x + platform_width - 1)
+                top = y - PLATFORM_HEIGHT
+            else:
+                x = rng.randint(start, end)
+                top = ground_top(x)
+            enemy_data.append([kind, (x, top - SPAWN_DROP), size[0], size[1]])
+    enemy_data.sort(key=lambda enemy: enemy[1][0])
+    enemy_data.append([-1, (width - PRINCESS_MARGIN, GROUND_HEIGHT), 9, 7])
+
+    return {
+        'ground': [[0, GROUND_HEIGHT, width, (0, 222, 0)]],
+        'wall': [[0, 0, HEIGHT, (255, 0, 0)], [width - 1, 0, HEIGHT, (0, 255, 255)]],
+        'pipe': pipes + [platform for layer in layers for platform in layer],
+        'enemy': enemy_data,
+        'mario': mario,
+        'seed': seed,
+    }
+
+
+def stress_level(seed=0):
+    """生成压力测试关卡（参数见 STRESS_LEVEL）"""
+    return generate_level(seed=seed, **STRESS_LEVEL)
+
+
+def level_size(level_data):
+    """
+    关卡规模
+
+    返回:
+        dict: 线段数（每根水管4条）、水管数和各类敌人数
+    """
+    pipes = len(level_data.get('pipe', []))
+    enemies = {}
+    for enemy in level_data.get('enemy', []):
+        enemies[enemy[0]] = enemies.get(enemy[0], 0) + 1
+    return {
+        'segments': len(level_data.get('ground', [])) + len(level_data.get('wall', [])) + 4 * pipes,
+        'pipes': pipes,
+        'enemies': enemies,
+    }
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {}
+    for option in ('--screens', '--pipes', '--layers', '--platforms',
+                   '--enemy1', '--enemy2', '--coins', '--seed', '--out'):
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+    if args:
+        print(f"未知的参数: {' '.join(args)}")
+        sys.exit(2)
+
+    data = generate_level(
+        screens=float(options.get('--screens', 20)),
+        pipes_per_screen=float(options.get('--pipes', 4)),
+        platform_layers=int(options.get('--layers', 2)),
+        platforms_per_screen=float(options.get('--platforms', 2)),
+        enemies={1: int(options.get('--enemy1', 50)),
+                 2: int(options.get('--enemy2', 50)),
+                 0: int(options.get('--coins', 50))},
+        seed=int(options.get('--seed', 0)),
+    )
+    size = level_size(data)
+    print(f"{size['segments']} 条线段, {size['pipes']} 根水管（含平台）, 敌人 {size['enemies']}")
+    if '--out' in options:
+        from level_format import save_level_source
+        save_level_source(data, options['--out'])
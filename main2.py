@@ -3,13 +3,33 @@ from level_data import *
 from level_d import *  # 导入简化关卡相关的所有类和函数
 from mario import *  # 导入精灵相关的所有类和函数
 from Collider import *  # 导入精update灵相关的所有类和函数
+from layers import *  # 导入分块图层
+from spatial import *  # 导入空间索引
+from inputs import *  # 导入输入（键盘、录制、重放）
+from profiler import *  # 导入性能分析器
+from tracing import *  # 导入追踪
 import math  # 用于数学计算和旋转
+import os  # 设置SDL视频驱动
+import time  # 快进模式计时
+import gc  # 性能分析覆盖层显示GC计数
 
 class Game:
     """游戏主类，负责管理游戏循环、渲染和事件处理"""
     
-    def __init__(self):
-        """初始化游戏基础设置"""
+    def __init__(self, headless=False, seed=None):
+        """
+        初始化游戏基础设置
+        
+        参数:
+            headless (bool): 无窗口模式，不显示画面、不等待，用 fast_forward() 尽快模拟（批量测试关卡用）
+            seed (int): 所有关卡使用的随机种子，None时使用各关卡数据里的种子
+        """
+        self.headless = headless
+        self.seed = seed
+        self.input = KeyboardInput()  # 输入来源，录制或重放时换掉
+        self.record_path = None       # 录制的输入要保存到的文件
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'  # 不打开真正的窗口
         pg.init()  # 初始化pygame
         self.screen = pg.display.set_mode((WIDTH, HEIGHT))  # 创建游戏窗口
         self.rect = self.screen.get_rect()  # 获取屏幕矩形区域
@@ -17,9 +37,14 @@ class Game:
         self.clock = pg.time.Clock()  # 创建时钟对象用于控制帧率
         self.playing = True  # 游戏运行状态标志
         self.game_over = False  # 游戏结束标志
-        self.all_group = pg.sprite.Group()  # 创建精灵组，管理所有精灵
+        self.all_group = CountingGroup()  # 创建精灵组，管理所有精灵（按类型计数）
+        self.profiler = profiler  # 帧性能分析器（游戏中按F3显示/隐藏）
+        if SHOW_PROFILER and not self.profiler.visible:
+            self.profiler.toggle()
         self.viewpoint = self.rect # 视口（摄像机）位置，初始为整个屏幕
 
+        # 后台预加载背景、结束画面和精灵图，主线程用到时直接取解码结果
+        self.preloader = ImagePreloader(PRELOAD_IMAGES).start()
         
         
         # 关卡管理
@@ -38,6 +63,12 @@ class Game:
         self.show_congrats = False  # 是否显示祝贺文本
         self.congrats_start_time = 0  # 祝贺文本开始显示的时间
         self.game_ending = False  # 游戏正在结束中
+        self.show_colliders = DEBUG_COLLIDERS  # 是否显示碰撞体轮廓（F1切换）
+        self.dirty_rects = DIRTY_RECTS  # 是否使用局部刷新（F2切换）
+        self.last_frame = None  # 上一帧画了什么，局部刷新时用来计算变化的区域
+        self.prev_positions = {}  # 这一步开始前各精灵的位置，绘制时用来插值
+        self.prev_view = None     # 这一步开始前摄像机的位置
+        self.alpha = 1.0          # 绘制时在上一步和这一步之间的比例（0~1）
         self.debug=True             #因为通关后再按左右空格马里奥会继续在success动画里上升一段，猜测是elapsed_time的问题，
         #但我们可以用一个小小变量即可解决，就是debug
 
@@ -48,7 +79,7 @@ class Game:
         if not self.success_animation:
             print("恭喜！马里奥找到了公主！")
             self.success_animation = True
-            self.success_start_time = pg.time.get_ticks()
+            self.success_start_time = sim_ticks()
             self.mario_rise_start_y = self.level.mario.pos.y
             
             # 停止马里奥的所有移动
@@ -73,7 +104,7 @@ class Game:
 
     def update_success_animation(self):
         """更新成功动画"""
-        current_time = pg.time.get_ticks()
+        current_time = sim_ticks()
         elapsed_time = current_time - self.success_start_time
         
         # 第一阶段：马里奥缓缓上升（3秒）
@@ -147,7 +178,7 @@ class Game:
         target_y = self.level.mario.pos.y - HEIGHT // 2
         
         # 限制摄像机位置
-        target_x = max(0, min(target_x, MAP_WIDTH - WIDTH))
+        target_x = max(0, min(target_x, self.level.width - WIDTH))
         target_y = max(0, min(target_y, HEIGHT))  # 限制垂直移动范围
         
         # 平滑移动到目标位置
@@ -156,25 +187,85 @@ class Game:
 
 
 
+    @traced()
     def events(self):
         """处理游戏事件"""
         for event in pg.event.get():  # 遍历所有事件
             if event.type == pg.QUIT:  # 如果点击关闭窗口
                 self.playing = False  # 结束游戏
             elif event.type == pg.KEYDOWN:  # 按键事件
-                if event.key == pg.K_1:  # 按1键切换到关卡1
-                    self.switch_level(1)
-                elif event.key == pg.K_2:  # 按2键切换到关卡2
-                    self.switch_level(2)
-                elif event.key == pg.K_3:  # 按3键切换到关卡3
-                    self.switch_level(3)
-                elif event.key == pg.K_r:  # 按R键重新开始当前关卡
-                    self.restart_current_level()
+                if event.key in COMMAND_KEYS:  # 1/2/3切换关卡，R重新开始
+                    # 在下一步开始前执行（见 run_command），录制和重放时落在确定的一步上
+                    self.input.press(event.key)
+                elif event.key == pg.K_F1:  # 按F1键显示/隐藏碰撞体轮廓
+                    self.show_colliders = not self.show_colliders
+                    return
+                elif event.key == pg.K_F2:  # 按F2键切换局部刷新模式
+                    self.dirty_rects = not self.dirty_rects
+                    self.last_frame = None
+                    return
+                elif event.key == pg.K_F3:  # 按F3键显示/隐藏性能分析覆盖层
+                    self.profiler.toggle()
+                    self.last_frame = None
+                    return
                 else:#不可去除，因为否则上下空格其他键回导致下一条语句被执行
                     return 
-                self.success_over_event()
+
+
+    def run_command(self, key):
+        """执行命令键：1/2/3切换到对应关卡，R重新开始当前关卡"""
+        if key == pg.K_1:  # 按1键切换到关卡1
+            self.switch_level(1)
+        elif key == pg.K_2:  # 按2键切换到关卡2
+            self.switch_level(2)
+        elif key == pg.K_3:  # 按3键切换到关卡3
+            self.switch_level(3)
+        elif key == pg.K_r:  # 按R键重新开始当前关卡
+            self.restart_current_level()
+        self.success_over_event()
+
+
+    def start_recording(self, path, restart=True, script=None):
+        """
+        录制之后每一步的输入，游戏循环结束时保存到 path
+
+        参数:
+            path (str): 录像文件
+            restart (bool): 是否先从当前关卡的开头重新开始；关卡刚开始、还没走过一步时
+                （例如刚调用过 new()）可以为False，直接从当前状态录制，不再显示一遍关卡提示
+            script: 按脚本给出按键状态（见 InputRecorder），None时录制键盘
+        """
+        if not restart and sim_step_count() != 0:
+            raise ValueError("关卡已经开始，不能不重新开始就录制（录像必须从关卡的第0步开始）")
+        self.input = InputRecorder(self.current_level, self.seed, script)
+        self.record_path = path
+        if restart:
+            self.restart_current_level()
+        else:
+            self.level.mario.input = self.input  # 不重新开始时 reset_groups 不会再调用，马里奥要改读录制的输入
+
+
+    def start_tracing(self, path):
+        """开始把各环节的耗时和计数写到追踪文件（JSON-lines），游戏结束时写完"""
+        tracer.start(path)
+
+
+    def save_recording(self):
+        """正在录制时把录到的输入写到文件"""
+        if self.record_path is not None:
+            self.input.save(self.record_path)
+            print(f"输入已录制到 {self.record_path}（{self.input.tick} 步）")
+
+
+    def start_replay(self, path):
+        """用录制时的关卡和随机种子重新开始，之后每一步的输入都来自录像"""
+        replay = InputReplay(path)
+        self.input = replay
+        self.seed = replay.seed
+        self.switch_level(replay.level)
 
                 
+    @traced()
     def switch_level(self, level_num):
         """切换到指定关卡"""
         if level_num in self.levels:
@@ -189,8 +280,10 @@ class Game:
             # 重置摄像机
             self.viewpoint = self.rect.copy()
             
-            # 创建新关卡
-            self.level = Level(self.levels[level_num])
+            # 创建新关卡，模拟时钟从0开始，同样的种子和输入每次运行结果都一样
+            reset_sim_clock()
+            self.level = Level(self.levels[level_num], self.seed)
+            self.set_background()
             
             # 重新初始化精灵组
             self.reset_groups()
@@ -201,6 +294,14 @@ class Game:
             self.show_level_transition(level_num)
             
             
+    def set_background(self):
+        """按当前关卡的宽度拉伸背景（宽度和上一关一样时沿用已经拉伸好的块）"""
+        width = self.level.width
+        if self.background is None or self.background.width != width:
+            self.background = BackgroundLayer(self.background_image, width, HEIGHT)
+            self.back_rect = pg.Rect(0, 0, width, HEIGHT)  # 背景（整个地图）的矩形区域
+            
+            
     def restart_current_level(self):
         """重新开始当前关卡"""
         self.switch_level(self.current_level)
@@ -208,34 +309,55 @@ class Game:
             
     def show_level_transition(self, level_num):
         """显示关卡切换提示"""
+        if self.headless:  # 无窗口模式不显示提示，也不等待
+            return
         
-        # 创建半透明覆盖层
-        overlay = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))  # 半透明黑色
+        # 半透明覆盖层（半透明黑色，只创建一次）
+        overlay = get_overlay((WIDTH, HEIGHT), (0, 0, 0, 150))
         
-        # 创建字体
-        font_large = pg.font.Font(None, 72)
-        font_small = pg.font.Font(None, 36)
-        
-        # 渲染文本
-        level_text = font_large.render(f"level {level_num}", True, (255, 255, 0))
+        # 渲染文本（字体和文字图像都有缓存）
+        level_text = render_text(f"level {level_num}", 72, (255, 255, 0))
             
-        hint_text = font_small.render("press 1 2 3 to shift level,press R restart", True, (255, 255, 255))
+        hint_text = render_text("press 1 2 3 to shift level,press R restart", 36, (255, 255, 255))
         
         # 计算位置
         level_rect = level_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 30))
         hint_rect = hint_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 40))
         
-        # 绘制到屏幕
-        self.screen.blit(overlay, (0, 0))
-        self.screen.blit(level_text, level_rect)
-        self.screen.blit(hint_text, hint_rect)
+        # 保存当前画面，每一帧在它上面重画覆盖层，避免半透明层越叠越黑
+        last_frame = self.screen.copy()
+        start_time = pg.time.get_ticks()
         
-        # 更新显示
-        pg.display.flip()
+        # 至少显示1秒，资源还没加载完就继续显示加载进度
+        while True:
+            done, total = self.preloader.progress()
+            
+            # 绘制到屏幕
+            self.screen.blit(last_frame, (0, 0))
+            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(level_text, level_rect)
+            self.screen.blit(hint_text, hint_rect)
+            
+            # 加载进度条
+            if total:
+                bar_rect = pg.Rect(WIDTH//2 - 150, HEIGHT//2 + 80, 300, 10)
+                fill_rect = bar_rect.copy()
+                fill_rect.width = int(bar_rect.width * done / total)
+                pg.draw.rect(self.screen, (255, 255, 0), fill_rect)
+                pg.draw.rect(self.screen, (255, 255, 255), bar_rect, 1)
+                loading_text = render_text(f"loading {done}/{total}", 36, (255, 255, 255))
+                self.screen.blit(loading_text, loading_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 110)))
+            
+            # 更新显示
+            pg.display.flip()
+            
+            if done == total and pg.time.get_ticks() - start_time >= 1000:
+                break
+            
+            pg.event.pump()  # 保持窗口响应，事件留在队列里不丢弃
+            self.clock.tick(FPS)
         
-        # 等待1秒
-        pg.time.delay(1000)
+        self.last_frame = None  # 屏幕上还是提示画面，下一帧需要整屏重画
     
             
     def reset_groups(self):
@@ -250,9 +372,66 @@ class Game:
             for enemy in self.level.enemies:
                 self.all_group.add(enemy)
         
-        # 添加所有碰撞体
-        if hasattr(self.level, 'all_colliders'):
-            self.all_group.add(*self.level.all_colliders)
+        # 碰撞体不再加入精灵组：有图像或颜色的已合成在关卡静态图层里
+        
+        self.level.mario.input = self.input  # 马里奥从游戏的输入来源读按键
+        
+        self.last_frame = None  # 精灵组变了，下一帧整屏重画
+        self.prev_positions = {}  # 换了关卡，不在新旧位置之间插值
+        self.prev_view = None
+        
+        # 精灵的空间索引，绘制时只取视口附近的精灵
+        self.sprite_index = SpatialGrid()
+        self.moving_sprites = []   # 会移动的精灵，每次绘制前同步它们在索引里的位置
+        self.indexed_changes = None  # 索引对应的是精灵组第几次变化后的成员
+        self.sync_sprite_index()
+        
+        
+    def sprite_bounds(self, sprite):
+        """精灵在世界坐标中占据的范围：碰撞矩形和图像（可能更宽或旋转后更大）的并集"""
+        rect = sprite.rect
+        size = sprite.image.get_size()
+        if size == rect.size:
+            return rect
+        return rect.union((rect.topleft, size))
+        
+        
+    def sync_sprite_index(self):
+        """
+        让空间索引跟上精灵的移动：只检查会移动的精灵，所在方格没变的什么都不做；
+        不会移动的精灵（公主）只在加入时登记一次
+        """
+        if self.indexed_changes != self.all_group.changes:
+            self.index_sprites()
+        index = self.sprite_index
+        for sprite in self.moving_sprites:
+            index.move(sprite, self.sprite_bounds(sprite))
+            
+            
+    def index_sprites(self):
+        """精灵组的成员变了（加入、kill()、移出）：删掉不在组里的，登记新加入的，重新列出会移动的精灵"""
+        index = self.sprite_index
+        for sprite in index.objects():
+            if not self.all_group.has(sprite):
+                index.remove(sprite)
+        self.moving_sprites = []
+        for sprite in self.all_group.sprites():
+            if sprite not in index:
+                index.insert(sprite, self.sprite_bounds(sprite))
+            if isinstance(sprite, (Mario, Enemy1, Enemy2, coin)):
+                self.moving_sprites.append(sprite)
+        self.indexed_changes = self.all_group.changes
+                    
+                    
+    def visible_sprites(self, area=None):
+        """
+        从空间索引里取出可能出现在屏幕上的精灵（按精灵组里的顺序）
+        
+        参数:
+            area (Rect): 屏幕上的一块区域，None表示整个视口
+        """
+        world_rect = self.viewpoint if area is None else area.move(self.viewpoint.x, self.viewpoint.y)
+        return self.sprite_index.query(world_rect)
 
 
 
@@ -263,12 +442,13 @@ class Game:
         
         
         # 加载并处理背景图像
-        self.background = load_image(BACKGROUND)  # 加载背景图片
-        self.background = pg.transform.scale(self.background, (MAP_WIDTH, HEIGHT))
-        
-        self.back_rect = self.background.get_rect()  # 获取背景图片的矩形区域
+        # 背景按视口大小分块，只拉伸、绘制可见的一两块，不再生成整张地图大小的背景
+        self.background_image = load_image(BACKGROUND, 'convert')
+        self.background = None
         
-        self.level = Level(self.levels[1])  # 创建关卡实例
+        reset_sim_clock()
+        self.level = Level(self.levels[1], self.seed)  # 创建关卡实例
+        self.set_background()
         
         
         # 重置精灵组
@@ -282,18 +462,104 @@ class Game:
         
 
     def run(self):
-        """游戏主循环"""
+        """
+        游戏主循环：模拟按固定步长推进，和绘制分开
+        
+        每帧把实际经过的时间攒起来，攒够一步就模拟一步，剩下不足一步的部分用来在两步之间插值绘制，
+        所以掉帧只会让画面变卡，不会改变跳跃高度、动画节奏等游戏规则。
+        """
+        accumulator = 0  # 还没有模拟的时间（毫秒）
         while self.playing:  # 当游戏处于运行状态时
-            self.clock.tick(FPS)  # 控制游戏帧率
-            self.events()  # 处理事件
-            self.update()  # 更新游戏状态
-            self.draw()  # 绘制游戏画面
+            accumulator += self.clock.tick(FPS)  # 控制游戏帧率，返回上一帧到现在的毫秒数
+            with trace_span('frame'):
+                self.profiler.start_frame()
+                self.events()  # 处理事件
+                self.profiler.lap('events')
+                # 卡顿太久时只补有限的几步，多出来的时间丢弃
+                accumulator = min(accumulator, SIM_STEP_MS * MAX_STEPS_PER_FRAME)
+                steps = 0
+                while accumulator >= SIM_STEP_MS and self.playing:
+                    self.step()  # 模拟一步
+                    accumulator -= SIM_STEP_MS
+                    steps += 1
+                self.profiler.lap('update')
+                self.draw(accumulator / SIM_STEP_MS)  # 绘制游戏画面
+            if tracer.enabled:
+                trace_counter('steps', steps)
+                trace_counter('sprites', len(self.all_group))
+                trace_counter('enemies', self.all_group.count(Enemy1, Enemy2))
+        
+        self.save_recording()
+        tracer.stop()
         
         # 游戏结束后显示结束画面
         self.show_end_screen()
               
 
 
+    @traced()
+    def step(self):
+        """推进一个固定步长：读取这一步的输入，记下移动前的位置，模拟时钟前进一步，再更新游戏状态"""
+        for key in self.input.begin_tick():
+            self.run_command(key)
+        self.remember_positions()
+        advance_sim_clock()
+        tracer.tick = sim_step_count()
+        self.update()
+
+
+    def remember_positions(self):
+        """记下这一步开始前精灵和摄像机的位置"""
+        if not RENDER_INTERPOLATION or self.headless:
+            return
+        self.prev_positions = {sprite: sprite.rect.topleft for sprite in self.all_group.sprites()}
+        self.prev_view = self.viewpoint.topleft
+
+
+    def interpolate(self, prev, current):
+        """按 self.alpha 在上一步和这一步的位置之间取点，瞬移时直接用新位置"""
+        alpha = self.alpha
+        if prev is None or alpha >= 1:
+            return current
+        dx = current[0] - prev[0]
+        dy = current[1] - prev[1]
+        if abs(dx) > INTERPOLATION_SNAP or abs(dy) > INTERPOLATION_SNAP:
+            return current
+        return (round(prev[0] + dx * alpha), round(prev[1] + dy * alpha))
+
+
+    def draw_position(self, sprite):
+        """精灵绘制时左上角的世界坐标"""
+        return self.interpolate(self.prev_positions.get(sprite), sprite.rect.topleft)
+
+
+    def fast_forward(self, ticks=None):
+        """
+        不绘制、不限帧率，尽快模拟当前关卡，直到通关、马里奥死亡、录像放完或模拟了 ticks 步
+        
+        参数:
+            ticks (int): 最多模拟多少步，None表示一直模拟到通关、死亡或录像放完
+        返回:
+            dict: outcome（'success'、'dead'、'finished' 或 'timeout'）、模拟的步数 ticks、耗时 seconds
+        """
+        start = time.perf_counter()
+        count = 0
+        outcome = 'timeout'
+        while ticks is None or count < ticks:
+            self.step()
+            count += 1
+            if self.level.is_success():
+                outcome = 'success'
+                break
+            if self.game_over:
+                outcome = 'dead'
+                break
+            if self.input.finished():
+                outcome = 'finished'
+                break
+        return {'outcome': outcome, 'ticks': count, 'seconds': time.perf_counter() - start}
+
+
     def update(self):
         """更新游戏状态"""
         self.update_camera()
@@ -323,85 +589,211 @@ class Game:
                 self.playing = False
 
 
-    def draw(self):
-        """绘制游戏画面 - 修复版"""
+    @traced()
+    def draw(self, alpha=1.0):
+        """
+        绘制游戏画面
+        
+        参数:
+            alpha (float): 绘制的是上一步到这一步之间的哪个位置，1表示这一步的位置（不插值）
+        """
+        if self.game_over:
+            return
+        # 空间索引只在绘制时用到，绘制前同步一次即可（一帧模拟了几步也只同步一次）
+        self.sync_sprite_index()
+        self.alpha = alpha if RENDER_INTERPOLATION else 1.0
+        # 摄像机同样插值；绘制期间换成插值后的视口，画完换回模拟用的视口
+        viewpoint = self.viewpoint
+        self.viewpoint = viewpoint.copy()
+        self.viewpoint.topleft = self.interpolate(self.prev_view, viewpoint.topleft)
+        try:
+            self.draw_frame()
+        finally:
+            self.viewpoint = viewpoint
+
+
+    def draw_frame(self):
+        """按当前的视口绘制一帧 - 修复版"""
         if not self.game_over:
+            # 局部刷新模式下，摄像机没动就只重画变化的区域
+            if self.dirty_rects and self.can_draw_dirty():
+                self.draw_dirty()
+                return
+            
             self.screen.fill(WHITE)
+            self.draw_scene()
+            self.draw_hud()
+            if self.profiler.visible:
+                self.profiler.draw(self.screen, self.get_profiler_counts())
+            self.profiler.lap('draw')
+            pg.display.flip()
+            self.profiler.lap('flip')
+            if self.dirty_rects:
+                self.remember_frame(self.get_sprite_rects())
             
-            # 1. 绘制背景（使用视口截取）
-            self.screen.blit(self.background, (0, 0), self.viewpoint)
             
-            # 2. 手动绘制所有精灵，应用摄像机偏移
-            sprites_to_draw = list(self.all_group.sprites())
+    def draw_scene(self, area=None):
+        """
+        绘制背景、静态图层和所有精灵
+        
+        参数:
+            area (Rect): 只需要重画的屏幕区域，None表示整屏；区域外的精灵直接跳过
+        """
+        # 1. 绘制背景（使用视口截取）
+        self.background.draw(self.screen, self.viewpoint)
+        
+        # 地面、墙壁、水管等静态物体已合成在关卡图层里，同样只贴可见的块
+        self.level.static_layer.draw(self.screen, self.viewpoint)
+        
+        # 2. 手动绘制视口附近的精灵，应用摄像机偏移
+        sprites_to_draw = self.visible_sprites(area)
+        
+        for sprite in sprites_to_draw:
+            # 计算屏幕坐标
+            x, y = self.draw_position(sprite)
+            screen_x = x - self.viewpoint.x
+            screen_y = y - self.viewpoint.y
             
-            for sprite in sprites_to_draw:
-                # 计算屏幕坐标
-                screen_x = sprite.rect.x - self.viewpoint.x
-                screen_y = sprite.rect.y - self.viewpoint.y
-                
-                # 检查精灵是否在屏幕内
-                if self.is_sprite_visible(screen_x, screen_y, sprite.rect.width, sprite.rect.height):
-                    try:
-                        # 如果是马里奥并且在成功动画中，使用旋转后的图像
-                        if sprite == self.level.mario and self.success_animation:
-                            self.screen.blit(sprite.image, (screen_x, screen_y))
-                        else:
-                            self.screen.blit(sprite.image, (screen_x, screen_y))
-                    except Exception as e:
-                        print(f"绘制精灵失败: {e}, 精灵类型: {type(sprite)}")
-            
-             # 3. 如果正在显示祝贺文本，绘制文本
-            if self.show_congrats:
-                self.draw_congratulations()
-            
-            
-            # 4. 显示调试信息
-            font = pg.font.Font(None, 24)
-            
-            # 计算各种精灵数量
-            enemy_count = sum(1 for sprite in self.all_group.sprites() if isinstance(sprite, (Enemy1, Enemy2)))
-            mario_count = sum(1 for sprite in self.all_group.sprites() if isinstance(sprite, Mario))
-            collider_count = len(self.all_group.sprites()) - enemy_count - mario_count
-            gold_count = self.level.get_gold_count()
-            
-            debug_text = [
-                f"now level is: {self.current_level}",
-                f"num of sprites: {len(self.all_group.sprites())}",
-                f"mario: {mario_count}",
-                f"have gold count: {gold_count}",
-                f"enemy: {enemy_count}",
-                f"collider_count: {collider_count}",
-                f"viewpoint: ({self.viewpoint.x}, {self.viewpoint.y})",
-                f"mario_pos: ({int(self.level.mario.pos.x)}, {int(self.level.mario.pos.y)})",
-                f"animi: {'success' if self.success_animation else '正常游戏'}",
-                
-            ]
+            # 检查精灵是否在屏幕内
+            if self.is_sprite_visible(screen_x, screen_y, sprite.rect.width, sprite.rect.height):
+                if area is not None and not area.colliderect((screen_x, screen_y) + sprite.image.get_size()):
+                    continue
+                try:
+                    # 如果是马里奥并且在成功动画中，使用旋转后的图像
+                    if sprite == self.level.mario and self.success_animation:
+                        self.screen.blit(sprite.image, (screen_x, screen_y))
+                    else:
+                        self.screen.blit(sprite.image, (screen_x, screen_y))
+                except Exception as e:
+                    print(f"绘制精灵失败: {e}, 精灵类型: {type(sprite)}")
+        
+        # 碰撞体轮廓（调试用，关闭时不产生任何开销）
+        if self.show_colliders:
+            self.draw_collider_overlay()
+        
+         # 3. 如果正在显示祝贺文本，绘制文本
+        if self.show_congrats:
+            self.draw_congratulations()
             
-            # self.level.mario.draw_health_bar(self.screen,self.level.mario.pos.x,self.level.mario.pos.y-20)
-            self.level.mario.draw_health_bar(self.screen,720,40)
             
-            for i, text in enumerate(debug_text):
-                text_surface = font.render(text, True, (255, 0, 0))
-                self.screen.blit(text_surface, (10, 10 + i * 25))
+    def get_profiler_counts(self):
+        """性能分析覆盖层显示的对象数量和游戏状态（精灵数量在精灵组加入、移除时已经计好，不用遍历）"""
+        return [
+            ('level', self.current_level),
+            ('gold', self.level.get_gold_count()),
+            ('sprites', len(self.all_group)),
+            ('mario', self.all_group.count(Mario)),
+            ('enemies', self.all_group.count(Enemy1, Enemy2)),
+            ('coins', self.all_group.count(coin)),
+            ('colliders', len(self.level.all_colliders)),
+            ('gc', '/'.join(map(str, gc.get_count()))),
+            ('viewpoint', f"({self.viewpoint.x}, {self.viewpoint.y})"),
+            ('mario_pos', f"({int(self.level.mario.pos.x)}, {int(self.level.mario.pos.y)})"),
+            ('anim', 'success' if self.success_animation else 'normal'),
+        ]
+        
+        
+    def draw_hud(self):
+        """绘制生命值条（调试信息在性能分析覆盖层里，按F3显示）"""
+        # self.level.mario.draw_health_bar(self.screen,self.level.mario.pos.x,self.level.mario.pos.y-20)
+        self.level.mario.draw_health_bar(self.screen,720,40)
+            
+            
+    def get_hud_rects(self):
+        """生命值条在屏幕上占据的矩形"""
+        return [self.level.mario.health_bar_rect(720, 40)]
+        
+        
+    def get_sprite_rects(self):
+        """所有可见精灵在屏幕上占据的矩形（按图像大小算，动画帧可能比碰撞矩形宽）"""
+        rects = []
+        for sprite in self.visible_sprites():
+            x, y = self.draw_position(sprite)
+            screen_x = x - self.viewpoint.x
+            screen_y = y - self.viewpoint.y
+            if self.is_sprite_visible(screen_x, screen_y, sprite.rect.width, sprite.rect.height):
+                rects.append(pg.Rect((screen_x, screen_y), sprite.image.get_size()))
+        return rects
+        
+        
+    def remember_frame(self, sprite_rects, hud_rects=None):
+        """记下这一帧画了什么，下一帧据此计算变化的区域"""
+        self.last_frame = {
+            'level': self.level,
+            'viewpoint': (self.viewpoint.x, self.viewpoint.y),
+            'sprite_rects': sprite_rects,
+            'health': self.level.mario.health,
+            'hud_rects': hud_rects if hud_rects is not None else self.get_hud_rects(),
+        }
+        
+        
+    def can_draw_dirty(self):
+        """上一帧画的是同一关卡、摄像机没有移动、也没有整屏的覆盖层时，才能只重画变化的区域"""
+        last = self.last_frame
+        return (last is not None
+                and last['level'] is self.level
+                and last['viewpoint'] == (self.viewpoint.x, self.viewpoint.y)
+                and not self.success_animation
+                and not self.show_congrats
+                and not self.show_colliders
+                and not self.profiler.visible)
+                
+                
+    def draw_dirty(self):
+        """局部刷新：只重画并提交精灵移动前后的位置和发生变化的生命值条"""
+        last = self.last_frame
+        sprite_rects = self.get_sprite_rects()
+        
+        # 精灵上一帧的位置要擦掉，这一帧的位置要画上
+        dirty = last['sprite_rects'] + sprite_rects
+        hud_rects = self.get_hud_rects()
+        if self.level.mario.health != last['health']:
+            dirty += last['hud_rects'] + hud_rects
+        dirty = merge_rects(dirty, self.screen.get_rect())
+        
+        # 变化的区域太大时，整屏重画反而更快
+        if sum(rect.width * rect.height for rect in dirty) > DIRTY_RECT_MAX_AREA * WIDTH * HEIGHT:
+            self.last_frame = None
+            self.draw_frame()
+            return
+        
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            # 背景盖住的区域不用先涂白
+            if not self.back_rect.contains(rect.move(self.viewpoint.x, self.viewpoint.y)):
+                self.screen.fill(WHITE, rect)
+            self.draw_scene(rect)
+            # 生命值条只有和这块区域重叠时才需要重画
+            if rect.collidelist(hud_rects) != -1:
+                self.draw_hud()
+        self.screen.set_clip(None)
+        
+        self.profiler.lap('draw')
+        if dirty:
+            pg.display.update(dirty)
+        self.profiler.lap('flip')
+        self.remember_frame(sprite_rects, hud_rects)
             
-            pg.display.flip()
             
+    def draw_collider_overlay(self):
+        """绘制视口内所有碰撞体的轮廓（调试用）"""
+        for collider in self.level.all_colliders:
+            if not collider.rect.colliderect(self.viewpoint):
+                continue
+            screen_rect = collider.rect.move(-self.viewpoint.x, -self.viewpoint.y)
+            color = getattr(collider, 'color', None) or (255, 0, 255)
+            pg.draw.rect(self.screen, color, screen_rect, 1)
             
             
     def draw_congratulations(self):
         """绘制祝贺文本"""
-        # 创建半透明黑色背景
-        overlay = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
+        # 半透明黑色背景
+        overlay = get_overlay((WIDTH, HEIGHT), (0, 0, 0, 150))
         self.screen.blit(overlay, (0, 0))
         
-        # 创建字体
-        font_large = pg.font.Font(None, 72)
-        font_small = pg.font.Font(None, 36)
-        
         # 渲染文本
-        congrats_text = font_large.render("great mario !!!", True, (255, 215, 0))  # 金色
-        hint_text = font_small.render("success", True, (255, 255, 255))
+        congrats_text = render_text("great mario !!!", 72, (255, 215, 0))  # 金色
+        hint_text = render_text("success", 36, (255, 255, 255))
         
         # 计算位置
         congrats_rect = congrats_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 30))
@@ -430,8 +822,7 @@ class Game:
         target_x = self.level.mario.pos.x - WIDTH // 2
         
         # 限制摄像机位置
-        map_width = self.background.get_width()
-        target_x = max(0, min(target_x, MAP_WIDTH-WIDTH))
+        target_x = max(0, min(target_x, self.level.width - WIDTH))
         # target_x = max(0, min(target_x, map_width - WIDTH)+500)
         
         # 平滑移动到目标位置
@@ -452,7 +843,7 @@ class Game:
         min_camera_x = 0
         
         # 摄像机右边界（不能超过地图宽度减去屏幕宽度）
-        max_camera_x = max(0, MAP_WIDTH - WIDTH)
+        max_camera_x = max(0, self.level.width - WIDTH)
         
         # 应用边界限制
         if self.viewpoint.x < min_camera_x:
@@ -465,7 +856,7 @@ class Game:
         if not self.game_over:
             self.screen.fill(WHITE)
             #清空屏幕，以免出现重影情况
-            self.screen.blit(self.background, (0, 0), self.viewpoint)
+            self.background.draw(self.screen, self.viewpoint)
             #将背景的可见部分绘制到屏幕上
             self.all_group.draw(self.screen)
             # 在屏幕上绘制所有精灵
@@ -484,7 +875,7 @@ class Game:
             self.screen.fill(WHITE)
             
             # 1. 绘制背景（使用视口截取）
-            self.screen.blit(self.background, (0, 0), self.viewpoint)
+            self.background.draw(self.screen, self.viewpoint)
             
             # 2. 手动绘制所有精灵，应用摄像机偏移
             for sprite in self.all_group:
@@ -517,10 +908,10 @@ class Game:
 
     def show_start_screen(self):
         """显示开始屏幕（暂未实现）"""
-        end_background = load_image('final.png')
+        end_background = load_image(END_BACKGROUND, 'convert')
         end_background = pg.transform.scale(end_background, (WIDTH, HEIGHT))
         
-        restart_img = load_image('restart.png')
+        restart_img = load_image(RESTART_BUTTON, 'alpha')
         button_width = restart_img.get_width()
         button_height = restart_img.get_height()
         restart_pos = ((WIDTH - button_width) // 2, HEIGHT // 2 - button_height)
@@ -533,12 +924,12 @@ class Game:
     def show_end_screen(self):
         """显示结束屏幕，包含背景、统一大小的按钮和视觉效果"""
         # 加载结束画面背景
-        end_background = load_image('final.png')
+        end_background = load_image(END_BACKGROUND, 'convert')
         end_background = pg.transform.scale(end_background, (WIDTH, HEIGHT))
     
         # 加载按钮图片
-        restart_img_orig = load_image('restart.png')
-        exit_img_orig = load_image('exit.png')
+        restart_img_orig = load_image(RESTART_BUTTON, 'alpha')
+        exit_img_orig = load_image(EXIT_BUTTON, 'alpha')
         
         # 使用两个按钮中较大的尺寸
         max_width = max(restart_img_orig.get_width(), exit_img_orig.get_width())
@@ -676,31 +1067,11 @@ class Game:
             
     def restart_game(self):
         """重新开始游戏"""
-        # 重置游戏状态
-        self.cleanup_before_restart()
-        
-        self.playing = True
-        self.game_over = False
-        self.viewpoint = self.rect.copy()  # 使用copy()避免引用问题
-        
         self.clear_display()  # 清空显示画面
         
-        # 重新创建关卡
-        self.level = Level()
-        
-        # 重新初始化 all_group
-        self.all_group.empty()
-        
-        # 重新添加所有精灵到组
-        self.all_group.add(self.level.mario)
-        
-        # 添加所有敌人
-        for enemy in self.level.enemies:
-            self.all_group.add(enemy)
-        
-        # 添加所有碰撞体
-        if hasattr(self.level, 'all_colliders'):
-            self.all_group.add(*self.level.all_colliders)
+        # 从第1关重新开始，和其他进入关卡的路径一样经过 switch_level：
+        # 模拟时钟归零、背景按关卡宽度准备、精灵组和马里奥的输入来源都重新设置
+        self.switch_level(1)
         
         # 重新开始游戏循环
         self.run()
@@ -712,6 +1083,14 @@ class Game:
             # 创建精灵副本以避免在遍历时修改
             sprites_list = list(self.all_group.sprites())
             
+            # 批量物理：走路的敌人一起更新，其余精灵照常逐个更新
+            batch = self.level.enemy_batch
+            if batch is not None:
+                walkers = [sprite for sprite in sprites_list
+                           if isinstance(sprite, (Enemy1, Enemy2)) and not sprite.dead]
+                batch.step(walkers)
+                sprites_list = [sprite for sprite in sprites_list if isinstance(sprite, Mario)]
+            
             for sprite in sprites_list:
                 try:
                     if isinstance(sprite, (Enemy1, Enemy2)):
@@ -731,8 +1110,6 @@ class Game:
             self.all_group.add(self.level.mario)
             for enemy in self.level.enemies:
                 self.all_group.add(enemy)
-            if hasattr(self.level, 'all_colliders'):
-                self.all_group.add(*self.level.all_colliders)
 
 
 
@@ -748,11 +1125,10 @@ class Game:
         self.clear_display()  # 清空显示画面
         
         # 重新创建关卡
-        self.level = Level()
+        self.level = Level(seed=self.seed)
         
         # 重新添加精灵到组
         self.all_group.add(self.level.mario)
-        self.all_group.add(self.level.all_colliders)
         
         # 重新设置摄像机位置
         self.viewpoint = self.screen.get_rect()        
@@ -774,8 +1150,7 @@ class Game:
         self.screen.fill((255,255,255))
         
         # 可选: 显示"重新开始..."提示
-        font = pg.font.Font(None, 36)
-        text = font.render("starting...", True, (111,111,111))
+        text = render_text("starting...", 36, (111,111,111))
         text_rect = text.get_rect(center=(WIDTH//2, HEIGHT//2))
         self.screen.blit(text, text_rect)
         
@@ -783,6 +1158,7 @@ class Game:
         pg.display.flip()
         
         # 短暂延迟让玩家看到提示
-        pg.time.delay(500)
+        if not self.headless:
+            pg.time.delay(500)
 
 
@@ -10,9 +10,8 @@ class Mario(pg.sprite.Sprite):
     
     def __init__(self):
         pg.sprite.Sprite.__init__(self)  # 调用父类构造函数
-        self.sheet = load_image('mario21.png')  # 加载精灵图
-        self.load_from_sheet()  # 从精灵图中提取动画帧
-        self.walking_timer = pg.time.get_ticks()  # 行走动画计时器
+        self.load_from_sheet()  # 从精灵图（或预烘焙图集）中提取动画帧
+        self.walking_timer = sim_ticks()  # 行走动画计时器
         self.image_index = 4  # 当前显示的动画帧索引
         self.image = self.frames[0]  # 当前显示的图像
         self.rect = self.image.get_rect()  # 获取图像矩形区域
@@ -22,6 +21,7 @@ class Mario(pg.sprite.Sprite):
         self.acc = vec(0, 0)  # 加速度向量
         self.landing = False  # 是否着陆标志
         self.dead = False  # 死亡标志
+        self.input = None  # 输入来源（由游戏设置），为None时直接读键盘
         
         
         self.death_animation_time = 0  # 死亡动画计时器，不知道是什么意思
@@ -34,8 +34,8 @@ class Mario(pg.sprite.Sprite):
         self.max_health = 100  # 最大生命值
         self.health = self.max_health  # 当前生命值
         self.health_regen_per_frame = 4  # 每帧恢复的生命值
-        self.last_regen_time = pg.time.get_ticks()  # 上次恢复生命值的时间
-        self.regen_interval = 16  # 恢复生命值的间隔（毫秒），大约60FPS
+        self.last_regen_step = sim_step_count()  # 上次恢复生命值时的模拟步数
+        self.regen_interval = 1  # 恢复生命值的间隔（模拟步数），每步一次
         self.health_bar_width = 60  # 生命条宽度
         self.health_bar_height = 8  # 生命条高度
 
@@ -49,13 +49,9 @@ class Mario(pg.sprite.Sprite):
         
         self.acc = vec(0, GRAVITY)  # 重置加速度，只保留重力
         
-        keys = pg.key.get_pressed()  # 获取按键状态
+        # 获取按键状态（这一步开始时读到的，重放录像时来自录像）
+        keys = self.input.get_pressed() if self.input is not None else pg.key.get_pressed()
                 
-        if keys[pg.K_r] and not self.dead:
-            #输入法需为英文
-            self.die()
-            return  # 死亡后不再处理其他逻辑
-        
         # 生命值恢复系统
         self.health_regen()
         
@@ -154,15 +150,15 @@ class Mario(pg.sprite.Sprite):
 
     def health_regen(self):
         """生命值恢复系统"""
-        current_time = pg.time.get_ticks()
+        current_step = sim_step_count()
         
-        # 每隔一定时间恢复生命值
-        if current_time - self.last_regen_time > self.regen_interval:
+        # 每隔一定步数恢复生命值
+        if current_step - self.last_regen_step >= self.regen_interval:
             # 恢复生命值，但不超过最大值
             self.health += self.health_regen_per_frame
             if self.health > self.max_health:
                 self.health = self.max_health
-            self.last_regen_time = current_time
+            self.last_regen_step = current_step
 
     def change_health(self, amount):
         """
@@ -219,16 +215,22 @@ class Mario(pg.sprite.Sprite):
                     (x, y, self.health_bar_width, self.health_bar_height), 1)
         
         # 显示生命值文字
-        font = pg.font.Font(None, 20)
-        health_text = font.render(f"HP: {self.health}/{self.max_health}", 
-                                 True, (255, 255, 255))
+        # 文字图像有缓存，生命值不变时不会重新渲染
+        health_text = render_text(f"HP: {self.health}/{self.max_health}", 20, (255, 255, 255))
         screen.blit(health_text, (x, y - 20))
 
 
+    def health_bar_rect(self, x, y):
+        """生命值条（含文字）在屏幕上占据的矩形，参数与 draw_health_bar 相同"""
+        health_text = render_text(f"HP: {self.health}/{self.max_health}", 20, (255, 255, 255))
+        text_rect = health_text.get_rect(topleft=(x, y - 20))
+        return text_rect.union(pg.Rect(x, y, self.health_bar_width, self.health_bar_height))
+
+
     def die(self):
         """马里奥死亡"""
         if not self.dead:
-            self.death_animation_time = pg.time.get_ticks()
+            self.death_animation_time = sim_ticks()
             # 设置死亡时的物理效果
             self.vel.y = self.death_velocity_y  # 向上弹起
             self.vel.x = 0  # 水平速度归零
@@ -239,7 +241,7 @@ class Mario(pg.sprite.Sprite):
 
     def death_animation(self):
         """死亡动画,待完善,现在是一点作用也没有"""
-        current_time = pg.time.get_ticks()
+        current_time = sim_ticks()
         elapsed_time = current_time - self.death_animation_time
         
         # 如果动画时间结束，不再更新位置
@@ -287,13 +289,13 @@ class Mario(pg.sprite.Sprite):
         """
         if self.image_index == 0:  # 如果当前是站立帧
             self.image_index += 1  # 切换到下一帧
-            self.walking_timer = pg.time.get_ticks()  # 重置计时器
+            self.walking_timer = sim_ticks()  # 重置计时器
         else:
             # 根据动画速度判断是否切换到下一帧
-            if (pg.time.get_ticks() - self.walking_timer > 
+            if (sim_ticks() - self.walking_timer > 
                     self.calculate_animation_speed()):
                 self.image_index += 1
-                self.walking_timer = pg.time.get_ticks()
+                self.walking_timer = sim_ticks()
         
         # 向右行走动画循环
         if facing == 'right':
@@ -309,6 +311,13 @@ class Mario(pg.sprite.Sprite):
 
     def load_from_sheet(self):
         """从精灵表中加载所有动画帧"""
+        # 有预烘焙图集时直接取现成的帧，不用解码精灵图
+        entry = load_atlas_entry(atlas_key('Mario', 'mario21.png', MARIO_SIZE))
+        if entry is not None:
+            self.frames = entry['frames']
+            return
+
+        self.sheet = load_image('mario21.png', 'alpha')  # 加载精灵图
         self.right_frames = []  # 向右动画帧列表
         self.left_frames = []   # 向左动画帧列表
 
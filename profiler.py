@@ -0,0 +1,166 @@
+import gc  # 垃圾回收回调，用来标出GC停顿
+import time  # 高精度计时
+from collections import Counter, deque
+from tools import *  # 导入工具函数
+from settings import *  # 导入游戏设置
+
+# 每帧分阶段计时，阶段的顺序也是条形图里的顺序
+PHASES = ('events', 'update', 'collision', 'draw', 'flip')
+PHASE_COLORS = {
+    'events': (120, 120, 255),
+    'update': (80, 200, 80),
+    'collision': (255, 160, 0),
+    'draw': (0, 200, 220),
+    'flip': (200, 100, 200),
+}
+
+
+class CountingGroup(pg.sprite.Group):
+    """
+    按类型计数的精灵组：精灵加入、移除（包括 kill()）时增减计数，
+    统计各类精灵数量时不用每帧遍历整个组；changes 每次增减都加1，
+    用来判断组里的成员自上次以来有没有变（数量相同、成员不同也能发现）
+    """
+
+    def __init__(self, *sprites):
+        self.counts = Counter()  # 精灵类 -> 数量
+        self.changes = 0         # 加入、移除的总次数
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.counts[type(sprite)] += 1
+        self.changes += 1
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.counts[type(sprite)] -= 1
+        self.changes += 1
+
+    def count(self, *types):
+        """组里属于 types（含子类）的精灵数，同 sum(isinstance(s, types) for s in 组)"""
+        return sum(number for cls, number in self.counts.items() if issubclass(cls, types))
+
+
+class FrameProfiler:
+    """
+    帧性能分析器：记录最近若干帧的帧时间、各阶段耗时和GC停顿，显示为覆盖层
+
+    游戏循环在每帧开始时调用 start_frame()，每个阶段结束时调用 lap(阶段名)，
+    两次调用之间的时间记到这个阶段上。隐藏时这两个方法只检查一下 visible 就返回，
+    也不注册GC回调，所以几乎没有开销。
+    """
+
+    def __init__(self, history=PROFILER_HISTORY):
+        """
+        参数:
+            history (int): 保留最近多少帧
+        """
+        self.visible = False
+        self.history = deque(maxlen=history)  # (帧时间, 各阶段耗时, GC耗时)，单位毫秒
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.frame_start = None  # 这一帧开始的时刻，None表示还没有开始
+        self.last = 0.0          # 上一次 lap 的时刻
+        self.gc_time = 0.0       # 这一帧里GC停顿的总时间（秒）
+        self.gc_start = None
+
+    def toggle(self):
+        """显示/隐藏覆盖层，显示时才开始计时"""
+        self.visible = not self.visible
+        self.history.clear()
+        self.frame_start = None
+        if self.visible:
+            gc.callbacks.append(self.on_gc)
+        elif self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    def start_frame(self):
+        """新的一帧开始，上一帧的数据存入历史"""
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            phases = {phase: value * 1000 for phase, value in self.phases.items()}
+            self.history.append(((now - self.frame_start) * 1000, phases, self.gc_time * 1000))
+        self.frame_start = self.last = now
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.gc_time = 0.0
+
+    def lap(self, phase):
+        """上一次 lap（或帧开始）到现在的时间记到 phase 上"""
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        self.phases[phase] += now - self.last
+        self.last = now
+
+    def on_gc(self, phase, info):
+        """gc.callbacks 回调：记录每次回收的停顿时间"""
+        if phase == 'start':
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            self.gc_time += time.perf_counter() - self.gc_start
+            self.gc_start = None
+
+    def averages(self, frames=30):
+        """最近 frames 帧各阶段的平均耗时（毫秒）"""
+        recent = list(self.history)[-frames:]
+        if not recent:
+            return dict.fromkeys(PHASES, 0.0)
+        return {phase: sum(record[1][phase] for record in recent) / len(recent) for phase in PHASES}
+
+    def pack_counts(self, counts, width):
+        """把 (名称, 值) 排成若干行文字，每行放到 width 像素宽为止"""
+        lines = []
+        for name, value in counts:
+            item = f"{name}:{value}"
+            if lines and render_text(f"{lines[-1]}  {item}", 18, (255, 255, 255)).get_width() <= width:
+                lines[-1] += f"  {item}"
+            else:
+                lines.append(item)
+        return lines
+
+    def draw(self, screen, counts, pos=(10, 10)):
+        """
+        绘制覆盖层：帧时间曲线（红点为发生了GC的帧）、各阶段平均耗时条、对象数量和游戏状态
+
+        参数:
+            screen (Surface): 绘制目标
+            counts (list): (名称, 值) 列表
+            pos: 覆盖层左上角
+        """
+        x, y = pos
+        width, graph_height = PROFILER_HISTORY * 2, 100
+        ms_scale = graph_height / 50  # 曲线最高显示50毫秒
+        count_lines = self.pack_counts(counts, width - 4)
+        height = graph_height + 6 + len(PHASES) * 16 + (len(count_lines) + 1) * 18 + 4
+        screen.blit(get_overlay((width, height), (0, 0, 0, 170)), (x, y))
+
+        # 帧时间曲线，横线为一帧的时间预算
+        budget_y = y + graph_height - int(1000 / FPS * ms_scale)
+        pg.draw.line(screen, (255, 255, 0), (x, budget_y), (x + width - 1, budget_y))
+        for index, (frame_ms, phases, gc_ms) in enumerate(self.history):
+            height = min(graph_height, int(frame_ms * ms_scale))
+            column = x + index * 2
+            pg.draw.line(screen, (0, 255, 0), (column, y + graph_height), (column, y + graph_height - height))
+            if gc_ms > 0:
+                pg.draw.circle(screen, (255, 0, 0), (column, y + 3), 2)
+
+        # 各阶段平均耗时条
+        averages = self.averages()
+        top = y + graph_height + 6
+        for index, phase in enumerate(PHASES):
+            row = top + index * 16
+            bar = min(width - 110, int(averages[phase] * ms_scale * 4))
+            pg.draw.rect(screen, PHASE_COLORS[phase], (x + 110, row + 3, max(1, bar), 10))
+            screen.blit(render_text(f"{phase} {averages[phase]:.2f}", 18, (255, 255, 255)), (x + 2, row))
+
+        # 帧时间、GC停顿和对象数量
+        row = top + len(PHASES) * 16 + 2
+        last = self.history[-1] if self.history else (0.0, None, 0.0)
+        for index, text in enumerate([f"frame {last[0]:.1f} ms  gc {last[2]:.2f} ms"] + count_lines):
+            screen.blit(render_text(text, 18, (255, 255, 255)), (x + 2, row + index * 18))
+
+
+# 游戏和关卡共用的分析器
+profiler = FrameProfiler()
@@ -0,0 +1,48 @@
+# 重放录像
+# 用 start.py --record 录下的输入重新玩一遍，同样的代码每次结果都一样。
+# 无窗口模式下以最快速度跑完，打印结局和一个状态摘要；代码改动后摘要变了，说明碰撞等行为变了。
+#
+# 用法:
+#   python replay.py run.json              无窗口快进重放，打印结局和状态摘要
+#   python replay.py run.json --window     打开窗口按正常速度重放
+import os
+import sys
+import hashlib
+
+from settings import *
+
+
+def state_digest(game):
+    """当前关卡中马里奥和所有敌人状态的摘要"""
+    level = game.level
+    digest = hashlib.sha256()
+    mario = level.mario
+    digest.update(repr((mario.pos.x, mario.pos.y, mario.vel.x, mario.vel.y, mario.health, mario.dead)).encode())
+    for enemy in level.all_enemies:
+        digest.update(repr((type(enemy).__name__, enemy.pos.x, enemy.pos.y, enemy.direction, enemy.dead)).encode())
+    digest.update(repr((level.get_gold_count(), level.is_success())).encode())
+    return digest.hexdigest()[:16]
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    window = '--window' in args
+    args = [arg for arg in args if arg != '--window']
+    if not args:
+        print("用法: python replay.py 录像文件 [--window]")
+        sys.exit(1)
+    path = args[0]
+
+    if not window:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 离线运行，不需要真正的窗口
+    from main2 import Game
+
+    game = Game(headless=not window)
+    game.new()
+    game.start_replay(path)
+    if window:
+        game.run()
+    else:
+        result = game.fast_forward()
+        print(f"关卡 {game.current_level}: {result['outcome']}, {result['ticks']} 步, "
+              f"{result['seconds']:.2f} 秒, 状态摘要 {state_digest(game)}")
@@ -34,3 +34,43 @@ TERMINAL_VELOCITY=9.9   # 最大速度：限制马里奥垂直移动的最高速
 GROUND_HEIGHT = HEIGHT - 66 +30 # 地面在屏幕上的y坐标（窗口高度减去66像素）:地面和窗口最下端之间的东西
 PLAIN_HEIGHT = 20  # 平台的高度（像素）:从地面的最下端到地面的最上端
 #height越大代表越向下
+
+# 图像缓存
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # load_image 解码缓存的上限（字节），超出后按最近最少使用淘汰
+TEXT_CACHE_SIZE = 256  # render_text 缓存的文字图像条数上限，超出后按最近最少使用淘汰
+
+# 碰撞体调试
+COLLIDER_SURFACES = False  # 是否为线段碰撞体生成可见的Surface；False时碰撞体只有矩形数据，不参与绘制
+DEBUG_COLLIDERS = False    # 是否一开始就显示碰撞体轮廓（游戏中按F1切换）
+
+# 局部刷新
+DIRTY_RECTS = False         # 摄像机不动时是否只重画、只提交变化的区域（游戏中按F2切换）
+DIRTY_RECT_MAX_AREA = 0.5   # 变化区域超过屏幕面积的这个比例时，直接整屏重画
+
+# 关卡编译缓存
+LEVEL_CACHE_MAX_FILES = 32  # resources/cache/levels/ 里最多保留多少个编译好的关卡，超出后删除最久没用过的
+COMPILED_LEVELS = True  # 关卡数据校验后编译成扁平数组并缓存到 resources/cache/levels/；False时每次逐条解释关卡数据
+
+# 空间索引
+SPATIAL_CELL_SIZE = 128  # 空间索引网格的方格边长（像素）
+
+# 敌人批量物理
+BATCHED_ENEMY_PHYSICS = False  # 是否用NumPy数组一次更新所有走路的敌人（需要安装NumPy，没有时自动逐个更新）
+
+# 随机数
+RANDOM_SEED = 0  # 关卡数据里没有 'seed'、命令行也没有指定时使用的随机种子，同样的种子和输入每次运行结果都一样
+
+# 固定步长模拟
+SIM_FPS = 60                     # 每秒模拟多少步；物理和游戏规则里的计时都按步推进，与实际帧率无关
+SIM_STEP_MS = 1000 / SIM_FPS     # 每步代表的时间（毫秒）
+MAX_STEPS_PER_FRAME = 5          # 一帧最多补几步，卡顿太久时丢弃多出来的时间，避免越补越慢
+RENDER_INTERPOLATION = True      # 绘制时是否在上一步和这一步的位置之间插值，让画面在帧率和步长不一致时也平滑
+INTERPOLATION_SNAP = 64          # 一步之内移动超过这个距离（像素）视为瞬移（复活、换关），直接画在新位置
+
+# 性能分析
+SHOW_PROFILER = False    # 是否一开始就显示性能分析覆盖层（游戏中按F3切换）
+PROFILER_HISTORY = 120   # 性能分析覆盖层保留最近多少帧
+
+# 追踪
+TRACE_BUFFER_SIZE = 65536   # 追踪事件环形缓冲区的容量，后台线程来不及写出时丢弃最旧的事件
+TRACE_FLUSH_INTERVAL = 0.5  # 追踪的后台线程每隔多少秒把缓冲区里的事件写到文件
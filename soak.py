@@ -0,0 +1,169 @@
+# 无窗口快进测试
+# 不打开窗口、不限帧率，把关卡尽快模拟若干步（或直到通关、马里奥死亡），
+# 用来在构建机上以远超实时的速度反复跑关卡，检查有没有异常、卡死或性能退化。
+#
+# 用法:
+#   python soak.py                       关卡1~3和生成的测试关卡，每关模拟3600步（实时1分钟）
+#   python soak.py 36000 1 3 gen         模拟步数，后面是要跑的关卡（gen为生成的测试关卡）
+#   python soak.py 600 stress            上万条线段、几千个敌人的压力测试关卡（很慢，不在默认列表里）
+#   python soak.py 600 my_level.json     JSON关卡文件（见 level_format.py）
+#   python soak.py --seed 7 3600         指定随机种子，同样的种子每次结果都一样
+#   python soak.py --trace soak.jsonl    把各环节的耗时写到追踪文件
+#
+# 最后总是跑一遍“一路向右”检查：在比 MAP_WIDTH 宽、没有水管和敌人的生成关卡里一直按右键，
+# 马里奥应该活着走到地图右端的公主那里，摄像机也要跟到地图最右边；
+# 再跑一遍“录像重放”检查：像 start.py --record 那样在关卡第0步开始录制一段脚本输入，
+# 重放录像的结局、步数和状态摘要必须和录制时一样。任何一项不通过时返回1。
+#
+# 快进的倍数和敌人数量大致成反比：关卡1~3能跑到实时的一百多倍，
+# 150个敌人的生成关卡只有实时的7~10倍（每步约2毫秒，达不到几百倍的目标）。
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # 离线运行，不需要真正的窗口
+
+from settings import *
+from inputs import *
+from main2 import Game
+from enemy import Enemy1, Enemy2
+from level_gen import generate_level, stress_level
+from tracing import tracer
+from replay import state_digest
+
+DEFAULT_TICKS = SIM_FPS * 60  # 默认每关模拟1分钟
+RECORD_TICKS = SIM_FPS * 20   # 录像重放检查录制多少步
+RUN_RIGHT_SCREENS = 8          # “一路向右”检查用的关卡有几屏宽（要比 MAP_WIDTH 宽）
+
+
+def soak(game, level, ticks):
+    """
+    从头开始模拟一个关卡
+
+    返回:
+        dict: fast_forward 的结果，另加关卡名、敌人数和相对实时的倍数
+    """
+    game.switch_level(level)
+    enemy_count = len(game.level.enemies)
+    # 每步的敌人更新次数：走路的敌人两次，金币、公主一次
+    walkers = sum(isinstance(enemy, (Enemy1, Enemy2)) for enemy in game.level.enemies)
+    result = game.fast_forward(ticks)
+    result['level'] = level
+    result['enemies'] = enemy_count
+    result['enemy_updates'] = enemy_count + walkers
+    result['ms_per_tick'] = result['seconds'] * 1000 / max(result['ticks'], 1)
+    result['speedup'] = result['ticks'] / SIM_FPS / max(result['seconds'], 1e-9)
+    return result
+
+
+def run_right(game, screens=RUN_RIGHT_SCREENS):
+    """
+    一路向右检查：生成一个空旷的宽关卡，一直按右键，马里奥应该活着走到公主那里
+
+    返回:
+        str: 检查不通过的原因，通过时为None
+    """
+    game.levels['run_right'] = generate_level(screens=screens, pipes_per_screen=0, platform_layers=0,
+                                              enemies={})
+    right = 1 << WATCHED_KEYS.index(pg.K_RIGHT)
+    keyboard, game.input = game.input, ScriptedInput(lambda tick: right)
+    max_view = 0
+    try:
+        game.switch_level('run_right')  # 换了输入再开始，马里奥才会从新的输入读按键
+        width = game.level.width
+        # 按最慢的步行速度也足够走完全程
+        for _ in range(width):
+            game.step()
+            max_view = max(max_view, game.viewpoint.x)
+            if game.level.is_success() or game.game_over:
+                break
+    finally:
+        game.input = keyboard
+    if not game.level.is_success():
+        return f"地图宽 {width}，马里奥没有走到公主那里，停在 x={game.level.mario.pos.x:.0f}"
+    if max_view < width - WIDTH - WIDTH // 2:
+        return f"地图宽 {width}，摄像机最远只到 x={max_view}"
+    return None
+
+
+def record_replay(game, level=1, ticks=RECORD_TICKS):
+    """
+    录像重放检查：从关卡第0步开始录制脚本输入（和 start.py --record 一样不重新开始关卡），
+    再重放录像，两次的结局、步数和状态摘要应该相同
+
+    返回:
+        str: 检查不通过的原因，通过时为None
+    """
+    left, right, space = (1 << WATCHED_KEYS.index(key) for key in (pg.K_LEFT, pg.K_RIGHT, pg.K_SPACE))
+
+    def script(tick):
+        # 大多数时候向右，隔一会儿向左，时不时跳一下
+        return (left if tick // 200 % 3 == 2 else right) | (space if tick % 45 < 10 else 0)
+
+    keyboard = game.input
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        game.switch_level(level)
+        game.start_recording(path, restart=False, script=script)
+        recorded = game.fast_forward(ticks)
+        recorded_digest = state_digest(game)
+        game.save_recording()
+        game.record_path = None
+
+        game.start_replay(path)
+        replayed = game.fast_forward()
+        replayed_digest = state_digest(game)
+    finally:
+        game.input = keyboard
+        os.remove(path)
+    # 录制到步数上限和录像放完是同一个结局
+    outcomes = [{'timeout': 'finished'}.get(result['outcome'], result['outcome']) for result in (recorded, replayed)]
+    if (outcomes[0], recorded['ticks'], recorded_digest) != (outcomes[1], replayed['ticks'], replayed_digest):
+        return (f"录制 {recorded['outcome']} {recorded['ticks']} 步 {recorded_digest}，"
+                f"重放 {replayed['outcome']} {replayed['ticks']} 步 {replayed_digest}")
+    return None
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    seed = None
+    if '--seed' in args:
+        index = args.index('--seed')
+        seed = int(args[index + 1])
+        del args[index:index + 2]
+    trace_path = None
+    if '--trace' in args:
+        index = args.index('--trace')
+        trace_path = args[index + 1]
+        del args[index:index + 2]
+    ticks = int(args[0]) if args else DEFAULT_TICKS
+    levels = [arg if arg in ('gen', 'stress') or arg.endswith('.json') else int(arg)
+              for arg in args[1:]] or [1, 2, 3, 'gen']
+
+    game = Game(headless=True, seed=seed)
+    for level in levels:
+        if level == 'gen':
+            game.levels[level] = generate_level()
+        elif level == 'stress':  # 生成很慢，只在要跑的时候生成
+            game.levels[level] = stress_level()
+        elif isinstance(level, str):
+            game.levels[level] = level  # 关卡按文件路径加载
+    game.new()
+    if trace_path:
+        game.start_tracing(trace_path)
+
+    for level in levels:
+        result = soak(game, level, ticks)
+        print(f"关卡 {result['level']}: {result['outcome']}, {result['ticks']} 步, "
+              f"{result['enemies']} 个敌人（每步约 {result['enemy_updates']} 次敌人更新）, "
+              f"{result['seconds']:.2f} 秒, 每步 {result['ms_per_tick']:.2f} 毫秒, 实时的 {result['speedup']:.0f} 倍")
+    tracer.stop()
+
+    failed = False
+    for name, check in (('一路向右', run_right), ('录像重放', record_replay)):
+        failure = check(game)
+        print(f"{name}: {failure or '通过'}")
+        failed = failed or failure is not None
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,300 @@
+from operator import attrgetter  # 按 rect.left 排序
+import pygame as pg  # 导入Pygame库并简写为pg
+from settings import *  # 导入游戏设置
+
+
+class SpatialGrid:
+    """
+    均匀网格空间索引：把世界切成边长为 cell_size 的方格，每个对象登记在它的矩形覆盖的所有方格里
+
+    查询时只看与查询矩形重叠的方格，所以查询的开销只和附近有多少对象有关，和整个关卡多大无关。
+    对象移动后调用 move()，所在方格没变时什么都不做。
+    查询结果按对象加入索引的先后排序，绘制顺序和精灵组里的顺序一致。
+    """
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        """
+        参数:
+            cell_size (int): 方格边长（像素）
+        """
+        self.cell_size = cell_size
+        self.cells = {}    # (列, 行) -> 该方格里的对象集合
+        self.entries = {}  # 对象 -> [方格范围, 登记时的矩形]
+        self.order = {}    # 对象 -> 加入顺序
+        self.counter = 0   # 下一个加入的对象的顺序号
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return obj in self.entries
+
+    def cell_range(self, rect):
+        """矩形覆盖的方格范围 (左列, 上行, 右列, 下行)，宽高为0的矩形也占一格"""
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                max(rect.left, rect.right - 1) // size, max(rect.top, rect.bottom - 1) // size)
+
+    def insert(self, obj, rect):
+        """把对象按矩形登记到索引里（已登记过的按新矩形移动）"""
+        if obj in self.entries:
+            self.move(obj, rect)
+            return
+        cell_range = self.cell_range(rect)
+        self.entries[obj] = [cell_range, pg.Rect(rect)]
+        self.order[obj] = self.counter
+        self.counter += 1
+        self._add_cells(obj, cell_range)
+
+    def remove(self, obj):
+        """从索引中删除对象，不存在时忽略"""
+        entry = self.entries.pop(obj, None)
+        if entry is not None:
+            del self.order[obj]
+            self._remove_cells(obj, entry[0])
+
+    def move(self, obj, rect):
+        """
+        对象移动后更新它所在的方格，还没登记的对象直接加入
+
+        返回:
+            bool: 所在方格是否发生了变化
+        """
+        entry = self.entries.get(obj)
+        if entry is None:
+            self.insert(obj, rect)
+            return True
+        # 大部分对象这一帧没动，先比较矩形，省去计算方格
+        if rect == entry[1]:
+            return False
+        entry[1] = pg.Rect(rect)
+        cell_range = self.cell_range(rect)
+        if cell_range == entry[0]:
+            return False
+        self._remove_cells(obj, entry[0])
+        self._add_cells(obj, cell_range)
+        entry[0] = cell_range
+        return True
+
+    def query(self, rect):
+        """
+        返回所在方格与矩形重叠的所有对象（按加入顺序排列）
+
+        结果是粗筛：对象的矩形不一定真的和查询矩形相交，需要时调用方再精确判断。
+        """
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        found = set()
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        if len(found) < 2:
+            return list(found)
+        return sorted(found, key=self.order.__getitem__)
+
+    def objects(self):
+        """索引里的所有对象"""
+        return list(self.entries)
+
+    def clear(self):
+        """清空索引"""
+        self.cells.clear()
+        self.entries.clear()
+        self.order.clear()
+        self.counter = 0
+
+    def _add_cells(self, obj, cell_range):
+        left, top, right, bottom = cell_range
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                self.cells.setdefault((cx, cy), set()).add(obj)
+
+    def _remove_cells(self, obj, cell_range):
+        left, top, right, bottom = cell_range
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(obj)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+
+class TerrainIndex:
+    """
+    关卡地形的静态空间索引：水平线、垂直线和水管内部碰撞体各有一个网格
+
+    马里奥和所有敌人查询同一个索引，每次只检查自己附近的碰撞体。
+    每个碰撞体登记时可以给一个专门用来检测碰撞的矩形（例如水管边缘的扩展区域）。
+    地形不会移动，每个方格范围的粗筛结果算过一次就缓存起来，之后同一范围的查询直接取用。
+    """
+
+    KINDS = ('horizontal', 'vertical', 'pipe_inner')
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        """
+        参数:
+            cell_size (int): 网格方格边长（像素）
+        """
+        self.grids = {kind: SpatialGrid(cell_size) for kind in self.KINDS}
+        self.rects = {}  # 碰撞体 -> 检测碰撞用的矩形
+        self.cache = {}  # (类别, 方格范围) -> 粗筛结果
+
+    def __len__(self):
+        return len(self.rects)
+
+    def add(self, collider, kind, rect=None):
+        """
+        登记一个碰撞体，同一类别的碰撞体按登记顺序返回
+
+        参数:
+            collider: 碰撞体（需要有 rect）
+            kind (str): 'horizontal'、'vertical' 或 'pipe_inner'
+            rect (Rect): 检测碰撞用的矩形，默认为碰撞体的 rect；不能比 rect 小
+        """
+        rect = pg.Rect(collider.rect if rect is None else rect)
+        self.rects[collider] = rect
+        self.grids[kind].insert(collider, rect)
+        self.cache.clear()
+
+    def candidates(self, kind, rect):
+        """某类碰撞体中所在方格与 rect 重叠的（粗筛结果，不要修改返回的列表）"""
+        grid = self.grids[kind]
+        key = (kind, grid.cell_range(rect))
+        found = self.cache.get(key)
+        if found is None:
+            found = self.cache[key] = grid.query(rect)
+        return found
+
+    def collide(self, rect):
+        """
+        用登记时给出的检测矩形判断与 rect 相交的碰撞体
+
+        返回:
+            dict: 类别 -> 碰撞体列表
+        """
+        rects = self.rects
+        return {kind: [collider for collider in self.candidates(kind, rect) if rect.colliderect(rects[collider])]
+                for kind in self.KINDS}
+
+    def spritecollide(self, sprite, kind):
+        """
+        与 pg.sprite.spritecollide(sprite, 该类碰撞体组, False) 的结果相同，
+        但只检查 sprite 附近的碰撞体
+        """
+        rect = sprite.rect
+        return [collider for collider in self.candidates(kind, rect) if rect.colliderect(collider.rect)]
+
+
+class SweepAndPrune:
+    """
+    沿x轴排序的区间粗筛（sweep and prune），用于会移动的对象之间的接触检测
+
+    对象按 rect.left 排序。对象每帧只移动几个像素，顺序几乎不变，
+    重新排序时Python的排序会识别出已经有序的片段，只需要接近线性的时间。
+    pairs() 一次扫描找出所有x区间重叠的对象对，query() 用二分查找取出与某个矩形x区间重叠的对象。
+    结果都是粗筛，是否真的相撞由调用方再用 colliderect 判断；结果按对象加入的先后排序。
+    对象的宽度以加入时为准（精灵的 rect 大小不会变）。
+    """
+
+    _left = attrgetter('rect.left')
+
+    def __init__(self, objects=()):
+        """
+        参数:
+            objects: 初始对象（需要有 rect），加入顺序即结果的顺序
+        """
+        self.objects = []   # 按 rect.left 排序的对象
+        self.order = {}     # 对象 -> 加入顺序
+        self.counter = 0    # 下一个加入的对象的顺序号
+        self.max_width = 0  # 最宽对象的宽度，查询时据此确定往左找多远
+        for obj in objects:
+            self.add(obj)
+        self.update()
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, obj):
+        return obj in self.order
+
+    def add(self, obj):
+        """加入对象，调用 update() 后参与查询"""
+        if obj not in self.order:
+            self.order[obj] = self.counter
+            self.counter += 1
+            self.objects.append(obj)
+            self.max_width = max(self.max_width, obj.rect.width)
+
+    def remove(self, obj):
+        """删除对象，不存在时忽略"""
+        if self.order.pop(obj, None) is not None:
+            self.objects.remove(obj)
+
+    def sync(self, group):
+        """
+        让对象集合和精灵组一致：组里新增的加入，已不在组里的删除
+
+        先按成员比较（集合比较在C里完成，比逐个核对快得多），成员相同时什么都不做；
+        同一步里一个敌人被删除、另一个加入，数量不变也能发现
+        """
+        if self.order.keys() == group.spritedict.keys():
+            return
+        for obj in list(self.objects):
+            if not group.has(obj):
+                self.remove(obj)
+        for obj in group:
+            self.add(obj)
+
+    def update(self):
+        """对象移动后重新按 rect.left 排序"""
+        self.objects.sort(key=self._left)
+
+    def _bisect(self, x):
+        """第一个 rect.left >= x 的对象的下标"""
+        objects = self.objects
+        lo, hi = 0, len(objects)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if objects[mid].rect.left < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, rect):
+        """
+        返回x区间与 rect 重叠的所有对象（按加入顺序排列）
+
+        对象的 left 一定小于 rect.right，且大于 rect.left - max_width，用二分查找直接定位这一段
+        """
+        lo = self._bisect(rect.left - self.max_width + 1)
+        hi = self._bisect(rect.right)
+        left = rect.left
+        found = [obj for obj in self.objects[lo:hi] if obj.rect.right > left]
+        if len(found) > 1:
+            found.sort(key=self.order.__getitem__)
+        return found
+
+    def pairs(self):
+        """
+        一次扫描找出所有x区间重叠的对象对
+
+        返回:
+            list: (a, b) 列表，a 先于 b 加入
+        """
+        order = self.order
+        result = []
+        active = []  # 右边缘还没被扫过的对象
+        for obj in self.objects:
+            left = obj.rect.left
+            active = [other for other in active if other.rect.right > left]
+            for other in active:
+                if order[other] < order[obj]:
+                    result.append((other, obj))
+                else:
+                    result.append((obj, other))
+            active.append(obj)
+        return result
@@ -1,6 +1,24 @@
+import sys
 from main2 import Game
 # 游戏启动代码
-game = Game()  # 创建游戏实例
+# 用法: python start.py [随机种子] [--record 录像文件] [--trace 追踪文件]
+args = sys.argv[1:]
+record_path = None
+if '--record' in args:  # 录制这一局的输入，可以用 replay.py 重放
+    index = args.index('--record')
+    record_path = args[index + 1]
+    del args[index:index + 2]
+trace_path = None
+if '--trace' in args:  # 把各环节的耗时写到追踪文件，事后分析卡顿
+    index = args.index('--trace')
+    trace_path = args[index + 1]
+    del args[index:index + 2]
+seed = int(args[0]) if args else None  # 不指定时使用各关卡数据里的种子
+game = Game(seed=seed)  # 创建游戏实例
 game.show_start_screen()  # 显示开始屏幕
 game.new()  # 初始化新游戏
+if record_path:  # 关卡刚开始，直接录制，不用重新开始
+    game.start_recording(record_path, restart=False)
+if trace_path:
+    game.start_tracing(trace_path)
 game.run()  # 运行游戏主循环 
\ No newline at end of file
@@ -1,27 +1,77 @@
 import os  # 导入操作系统接口模块
+import json  # 读取图集索引
+import concurrent.futures  # 后台线程池，用于预加载图像
+from collections import OrderedDict  # 有序字典，用来实现LRU缓存
 import pygame as pg  # 导入Pygame库并简写为pg
+from settings import IMAGE_CACHE_MAX_BYTES, TEXT_CACHE_SIZE  # 图像、文字缓存上限
+from settings import SIM_FPS  # 每秒模拟步数
+from tracing import traced  # 追踪资源加载的耗时
 
 
-def load_image(filename):
+# 已解码图像的进程级缓存
+# 键为 (完整路径, 像素格式)，值为Surface；OrderedDict的顺序就是最近使用的顺序
+_image_cache = OrderedDict()
+_image_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+# 预加载器提交、但还没被 load_image 取走的解码任务，键与 _image_cache 相同
+_pending = {}
+
+# 字体和文字图像缓存
+_fonts = {}                # (字体名, 字号) -> Font
+_text_cache = OrderedDict()  # (字体名, 字号, 文字, 颜色, 抗锯齿) -> 渲染好的Surface
+_overlays = {}             # (宽, 高, RGBA颜色) -> 半透明覆盖层
+
+# 预烘焙图集（由 bake_assets.py 生成）
+ATLAS_VERSION = 1          # 图集格式版本，切帧逻辑改动后加1，旧图集自动作废
+ATLAS_ENABLED = True       # 设为False时忽略图集，全部现场切帧（烘焙时使用）
+_atlas = None              # None表示还没加载，False表示不可用，否则为 (图集Surface, 条目字典)
+_atlas_entries = {}        # 条目名 -> 取出过的条目（帧已切成子表面），同名条目的所有实例共用
+
+# 模拟时钟：游戏规则里的计时都用它，每个固定步长前进一步，与真实时间无关
+_sim_step_count = 0
+
+
+def _surface_bytes(surface):
+    """估算一个Surface占用的像素内存（字节）"""
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def _cache_put(key, surface):
+    """把Surface放进缓存，超出上限时从最久没用过的开始淘汰，但至少保留刚放入的这一张"""
+    _image_cache[key] = surface
+    _image_cache_stats['bytes'] += _surface_bytes(surface)
+    while _image_cache_stats['bytes'] > IMAGE_CACHE_MAX_BYTES and len(_image_cache) > 1:
+        _, old_surface = _image_cache.popitem(last=False)
+        _image_cache_stats['bytes'] -= _surface_bytes(old_surface)
+        _image_cache_stats['evictions'] += 1
+
+
+@traced()
+def load_image(filename, pixel_format=None):
     """
     加载图像文件的工具函数
-    
+
     参数:
         filename (str): 图像文件名（包括扩展名）
-        
+        pixel_format (str): 像素格式，None表示保持文件原格式，
+            'convert'表示转换为屏幕格式，'alpha'表示转换为带透明通道的屏幕格式
+
     返回:
         Surface: Pygame图像表面对象
-        
+
     功能说明:
         这个函数负责从项目的资源目录中加载图像文件。
         它会自动构建正确的文件路径，确保无论程序从哪个目录运行，
         都能正确找到图像资源。
+        解码结果按 (路径, 像素格式) 缓存，同一张图只解码、转换一次，
+        切换关卡或重新开始时直接复用。返回的Surface是共享的，调用者不要原地修改，
+        需要修改时请先 copy() 或 scale() 出一份新的。
     """
     # 获取当前Python文件的绝对路径的目录名
     # os.path.abspath(__file__) 获取当前文件的绝对路径
     # os.path.dirname() 获取该路径的目录部分
     src = os.path.dirname(os.path.abspath(__file__))
-    
+
     # 构建图像文件的完整路径
     # os.path.join() 智能拼接路径，自动处理不同操作系统的路径分隔符
     # 假设项目结构为：
@@ -31,8 +81,336 @@ def load_image(filename):
     #       └── graphics/
     #           └── 图像文件
     path = os.path.join(src, 'resources', 'graphics', filename)
-    
-    # 使用Pygame加载图像并返回Surface对象
-    # pg.image.load() 是Pygame加载图像的标准方法
-    # 支持多种格式：PNG, JPG, GIF, BMP等
-    return pg.image.load(path)
\ No newline at end of file
+
+    # 还没有创建窗口时无法转换格式，只能返回原格式（也不缓存，免得以后拿到未转换的版本）
+    if pixel_format is not None and pg.display.get_surface() is None:
+        return pg.image.load(path)
+
+    key = (path, pixel_format)
+    surface = _image_cache.get(key)
+    if surface is not None:
+        # 命中：移到队尾，表示最近使用过
+        _image_cache.move_to_end(key)
+        _image_cache_stats['hits'] += 1
+        return surface
+
+    _image_cache_stats['misses'] += 1
+
+    future = _pending.pop(key, None)
+    if future is not None:
+        # 预加载器已经在后台解码这张图，等它完成（通常早已完成）即可
+        surface = future.result()
+    else:
+        # 使用Pygame加载图像并返回Surface对象
+        # pg.image.load() 是Pygame加载图像的标准方法
+        # 支持多种格式：PNG, JPG, GIF, BMP等
+        surface = pg.image.load(path)
+    if pixel_format == 'convert':
+        surface = surface.convert()
+    elif pixel_format == 'alpha':
+        surface = surface.convert_alpha()
+
+    _cache_put(key, surface)
+    return surface
+
+
+class ImagePreloader:
+    """
+    后台图像预加载器
+
+    在线程池里提前解码一批图像，主线程用 load_image 取图时直接拿到解码结果，
+    格式转换（convert/convert_alpha）仍在主线程完成。
+    progress()/is_ready()/wait() 可用来显示加载进度或等待全部完成。
+    """
+
+    def __init__(self, images, workers=4):
+        """
+        参数:
+            images (list): [(文件名, 像素格式), ...]，像素格式同 load_image
+            workers (int): 线程数
+        """
+        self.images = list(images)
+        self.workers = workers
+        self.futures = []
+
+    def start(self):
+        """把所有还没缓存的图像提交到线程池解码"""
+        src = os.path.dirname(os.path.abspath(__file__))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        for filename, pixel_format in self.images:
+            path = os.path.join(src, 'resources', 'graphics', filename)
+            key = (path, pixel_format)
+            if key in _image_cache or key in _pending:
+                continue
+            future = executor.submit(pg.image.load, path)
+            _pending[key] = future
+            self.futures.append(future)
+        # 不再提交新任务，线程在任务完成后自行退出
+        executor.shutdown(wait=False)
+        return self
+
+    def progress(self):
+        """返回 (已完成数, 总数)"""
+        done = sum(1 for future in self.futures if future.done())
+        return done, len(self.futures)
+
+    def is_ready(self):
+        """所有图像是否都已解码完成"""
+        return all(future.done() for future in self.futures)
+
+    def wait(self, timeout=None):
+        """等待全部解码完成（屏障），超时返回False"""
+        # 解码失败的任务也算完成，异常留给 load_image 在主线程重新抛出
+        _, not_done = concurrent.futures.wait(self.futures, timeout)
+        return not not_done
+
+
+@traced()
+def load_display_image(filename, area, size, colorkey=None):
+    """
+    加载图像中的一块区域并缩放到显示尺寸，结果同时缓存在内存和磁盘上
+
+    参数:
+        filename (str): 图像文件名（包括扩展名）
+        area (tuple): 要截取的区域 (x, y, width, height)
+        size (tuple): 缩放后的显示尺寸 (width, height)
+        colorkey: 透明色，None表示不设置
+
+    返回:
+        Surface: 显示尺寸的图像，由缓存共享，调用者不要原地修改
+
+    功能说明:
+        适合大尺寸原图只用来显示一个小精灵的情况（例如公主的 himesama.jpg）。
+        第一次调用时解码原图、截取、缩放，然后把小图保存到 resources/cache/，
+        原图用完立刻丢弃，不进入 load_image 的缓存；以后直接读取磁盘上的小图。
+        原图比缓存文件新时会重新生成。
+    """
+    src = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(src, 'resources', 'graphics', filename)
+
+    key = (path, ('display', tuple(area), tuple(size)))
+    surface = _image_cache.get(key)
+    if surface is not None:
+        _image_cache.move_to_end(key)
+        _image_cache_stats['hits'] += 1
+        return surface
+
+    _image_cache_stats['misses'] += 1
+
+    # 磁盘缓存文件名包含截取区域和显示尺寸，不同参数互不覆盖
+    stem = os.path.splitext(filename)[0]
+    cache_name = '%s_%d_%d_%d_%d_%dx%d.png' % ((stem,) + tuple(area) + tuple(size))
+    cache_path = os.path.join(src, 'resources', 'cache', cache_name)
+
+    if (os.path.exists(cache_path) and
+            os.path.getmtime(cache_path) >= os.path.getmtime(path)):
+        surface = pg.image.load(cache_path)
+    else:
+        # 原图只在这个作用域里存在，截取缩放后就被释放
+        original = pg.image.load(path)
+        surface = pg.transform.scale(original.subsurface(area), size)
+        del original
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            pg.image.save(surface, cache_path)
+        except (OSError, pg.error) as e:
+            print(f"警告: 无法写入缓存图片 {cache_path}，错误: {e}")
+
+    if pg.display.get_surface() is not None:
+        surface = surface.convert()
+    if colorkey is not None:
+        surface.set_colorkey(colorkey)
+
+    _cache_put(key, surface)
+    return surface
+
+
+def get_font(size, name=None):
+    """取得字体对象，同一 (字体名, 字号) 只创建一次"""
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = pg.font.Font(name, size)
+        _fonts[key] = font
+    return font
+
+
+def render_text(text, size, color, name=None, antialias=True):
+    """
+    渲染一行文字，结果按 (字体名, 字号, 文字, 颜色, 抗锯齿) 缓存
+
+    参数:
+        text (str): 要显示的文字
+        size (int): 字号
+        color (tuple): 文字颜色
+        name (str): 字体文件，None表示pygame默认字体
+        antialias (bool): 是否抗锯齿
+
+    返回:
+        Surface: 渲染好的文字图像，由缓存共享，不要原地修改
+
+    功能说明:
+        HUD上的文字大多每帧都一样，只有数值变化时才会真正重新渲染；
+        缓存最多保留 TEXT_CACHE_SIZE 条，超出后淘汰最久没用过的。
+    """
+    key = (name, size, text, tuple(color), antialias)
+    surface = _text_cache.get(key)
+    if surface is not None:
+        _text_cache.move_to_end(key)
+        return surface
+    surface = get_font(size, name).render(text, antialias, color)
+    _text_cache[key] = surface
+    while len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return surface
+
+
+def get_overlay(size, color):
+    """取得纯色（可半透明）的覆盖层，同样的尺寸和颜色只创建一次，不要原地修改"""
+    key = (tuple(size), tuple(color))
+    overlay = _overlays.get(key)
+    if overlay is None:
+        overlay = pg.Surface(size, pg.SRCALPHA)
+        overlay.fill(color)
+        _overlays[key] = overlay
+    return overlay
+
+
+def merge_rects(rects, bounds=None):
+    """
+    合并相互重叠的矩形（局部刷新时用，避免同一块区域重画多次）
+
+    参数:
+        rects: 矩形列表
+        bounds (Rect): 给出时先把每个矩形裁剪到这个范围内，裁剪后为空的丢弃
+    返回:
+        list: 互不重叠的矩形列表
+    """
+    pending = [pg.Rect(rect) for rect in rects]
+    if bounds is not None:
+        pending = [rect.clip(bounds) for rect in pending]
+    merged = []
+    for rect in pending:
+        if rect.width <= 0 or rect.height <= 0:
+            continue
+        # 和已有矩形重叠就合并成包围矩形，合并后可能又和别的重叠，继续合并
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+def sim_ticks():
+    """模拟时间（整数毫秒），用法同 pg.time.get_ticks()，但只随模拟步数增加"""
+    return _sim_step_count * 1000 // SIM_FPS
+
+
+def sim_step_count():
+    """到目前为止模拟了多少步"""
+    return _sim_step_count
+
+
+def advance_sim_clock(steps=1):
+    """模拟时钟前进 steps 步"""
+    global _sim_step_count
+    _sim_step_count += steps
+
+
+def reset_sim_clock():
+    """模拟时钟归零（开始新关卡时）"""
+    global _sim_step_count
+    _sim_step_count = 0
+
+
+def get_image_cache_stats():
+    """返回图像缓存的统计信息（命中、未命中、淘汰次数、条目数和占用字节）"""
+    stats = dict(_image_cache_stats)
+    stats['entries'] = len(_image_cache)
+    return stats
+
+
+def clear_image_cache():
+    """清空图像缓存并重置统计"""
+    _image_cache.clear()
+    for name in _image_cache_stats:
+        _image_cache_stats[name] = 0
+
+
+def atlas_path(*names):
+    """返回图集相关文件的完整路径（位于 resources/cache/）"""
+    src = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(src, 'resources', 'cache', *names)
+
+
+def atlas_key(*parts):
+    """把条目的各个组成部分拼成图集索引里的键，例如 atlas_key('Enemy2', 'mario21.png', 200, 200)"""
+    return '|'.join(str(part) for part in parts)
+
+
+def _load_atlas():
+    """加载图集和索引，检查版本和源图修改时间，不可用时返回False"""
+    try:
+        with open(atlas_path('atlas.json'), encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if index.get('version') != ATLAS_VERSION:
+        print("警告: 图集版本不匹配，请重新运行 bake_assets.py")
+        return False
+
+    # 任何一张源图比烘焙时新，就说明图集过期了
+    for filename, mtime in index.get('sources', {}).items():
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'resources', 'graphics', filename)
+        if os.path.exists(source) and os.path.getmtime(source) > mtime:
+            print(f"警告: {filename} 比图集新，请重新运行 bake_assets.py")
+            return False
+
+    # 图集像素以原始RGBA字节保存，一次读入即可，不需要解码图片；
+    # 转换成显示格式后绘制才快，转换本身会复制一份像素，所以读完的字节随即丢弃
+    try:
+        with open(atlas_path('atlas.bin'), 'rb') as f:
+            surface = pg.image.frombytes(f.read(), tuple(index['size']), 'RGBA').convert_alpha()
+    except (OSError, ValueError, KeyError, pg.error):
+        return False
+    return surface, index.get('entries', {})
+
+
+@traced()
+def load_atlas_entry(name):
+    """
+    从预烘焙图集中取出一个条目
+
+    参数:
+        name (str): 条目名，由 atlas_key() 生成
+
+    返回:
+        dict: 条目信息，其中 'frames' 是图集上的子表面元组（不复制像素）；
+            图集不存在、已过期或没有这个条目时返回None，调用者应退回现场切帧。
+            同名条目每次返回同一个对象，所有实例共用同一组帧，调用者不能修改这些帧
+    """
+    global _atlas
+    if not ATLAS_ENABLED:
+        return None
+    if _atlas is None:
+        # 没有窗口时无法转换格式，等窗口创建后再加载
+        if pg.display.get_surface() is None:
+            return None
+        _atlas = _load_atlas()
+    if not _atlas:
+        return None
+
+    entry = _atlas_entries.get(name)
+    if entry is not None:
+        return entry
+    surface, entries = _atlas
+    entry = entries.get(name)
+    if entry is None:
+        return None
+    entry = dict(entry)
+    entry['frames'] = tuple(surface.subsurface(rect) for rect in entry['frames'])
+    _atlas_entries[name] = entry
+    return entry
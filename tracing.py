@@ -0,0 +1,207 @@
+import os  # 进程号
+import json  # 追踪文件为每行一个JSON对象
+import time  # 高精度计时
+import atexit  # 程序退出时写完剩下的事件
+import threading  # 后台写文件的线程
+import functools
+from collections import deque
+from settings import SIM_FPS  # 每秒模拟步数，写在文件开头
+from settings import TRACE_BUFFER_SIZE, TRACE_FLUSH_INTERVAL  # 环形缓冲区容量、写文件间隔
+
+TRACE_VERSION = 1  # 追踪文件格式版本
+
+
+class _NullSpan:
+    """不追踪时 trace_span() 返回的空上下文，进出都不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一段要计时的代码，退出时把耗时记到追踪器里"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    追踪器：记录代码段耗时（span）和计数（counter），由后台线程写成 JSON-lines 文件
+
+    游戏线程只把事件放进有界的环形缓冲区，不做任何文件操作，所以追踪不会让某一帧卡住；
+    后台线程来不及写出时缓冲区丢弃最旧的事件，丢了多少记在文件最后一行。
+    没有 start() 时 enabled 为False，各个记录函数检查一下就返回，几乎没有开销。
+
+    文件格式（每行一个JSON对象，时间单位为微秒，从 start() 算起）:
+        {"type": "meta", "version": 1, "sim_fps": 60, "pid": ..., "started": ...}
+        {"type": "span", "name": "Level.update", "ts": 1200, "dur": 85, "tick": 3}
+        {"type": "counter", "name": "sprites", "ts": 1300, "tick": 3, "value": 11}
+        {"type": "end", "events": ..., "dropped": ...}
+    """
+
+    def __init__(self, capacity=TRACE_BUFFER_SIZE, flush_interval=TRACE_FLUSH_INTERVAL):
+        """
+        参数:
+            capacity (int): 环形缓冲区最多保存多少个还没写出的事件
+            flush_interval (float): 后台线程每隔多少秒写一次文件
+        """
+        self.enabled = False
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=capacity)
+        self.tick = 0          # 当前是第几个模拟步，由游戏每步更新，写进每个事件
+        self.origin = 0.0      # start() 的时刻，事件的时间都相对于它
+        self.recorded = 0      # 放进缓冲区的事件数
+        self.written = 0       # 已经写到文件的事件数
+        self.path = None
+        self.file = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.registered = False  # 是否已经注册了退出时的 stop()
+
+    def start(self, path):
+        """开始追踪，事件写到 path（已有的文件会被覆盖）"""
+        if self.enabled:
+            self.stop()
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.origin = time.perf_counter()
+        self.buffer.clear()
+        self.recorded = self.written = 0
+        self.record({'type': 'meta', 'version': TRACE_VERSION, 'sim_fps': SIM_FPS,
+                     'pid': os.getpid(), 'started': time.time()})
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._write_loop, name='trace-writer', daemon=True)
+        self.thread.start()
+        self.enabled = True
+        if not self.registered:
+            atexit.register(self.stop)
+            self.registered = True
+
+    def stop(self):
+        """停止追踪，写完缓冲区里剩下的事件并关闭文件"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.stopping.set()
+        self.thread.join()
+        self._drain()
+        dropped = self.recorded - self.written
+        self.file.write(json.dumps({'type': 'end', 'events': self.recorded, 'dropped': dropped},
+                                   separators=(',', ':')) + '\n')
+        self.file.close()
+        self.file = None
+        self.thread = None
+
+    def record(self, event):
+        """把一个事件放进环形缓冲区（满了时最旧的事件被挤掉）"""
+        self.buffer.append(event)
+        self.recorded += 1
+
+    def now(self):
+        """从 start() 到现在的微秒数"""
+        return int((time.perf_counter() - self.origin) * 1e6)
+
+    def add_span(self, name, start, end, args=None):
+        """
+        记录一段代码的耗时
+
+        参数:
+            name (str): 代码段的名字
+            start, end (float): time.perf_counter() 的开始、结束时刻
+            args (dict): 附加信息，None表示没有
+        """
+        if not self.enabled:
+            return
+        event = {'type': 'span', 'name': name, 'ts': int((start - self.origin) * 1e6),
+                 'dur': int((end - start) * 1e6), 'tick': self.tick}
+        if args:
+            event['args'] = args
+        self.record(event)
+
+    def span(self, name, **args):
+        """用 with 计时一段代码：with tracer.span('frame'): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def counter(self, name, value):
+        """记录某个量的当前值（精灵数、每帧模拟步数等）"""
+        if not self.enabled:
+            return
+        self.record({'type': 'counter', 'name': name, 'ts': self.now(), 'tick': self.tick, 'value': value})
+
+    def _write_loop(self):
+        """后台线程：定时把缓冲区里的事件写到文件"""
+        while not self.stopping.wait(self.flush_interval):
+            self._drain()
+
+    def _drain(self):
+        """取出缓冲区里的所有事件写到文件"""
+        lines = []
+        while True:
+            try:
+                event = self.buffer.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            self.written += len(lines)
+
+
+# 整个游戏共用的追踪器
+tracer = Tracer()
+
+
+def trace_span(name, **args):
+    """计时一段代码，同 tracer.span()"""
+    return tracer.span(name, **args)
+
+
+def trace_counter(name, value):
+    """记录某个量的当前值，同 tracer.counter()"""
+    tracer.counter(name, value)
+
+
+def traced(name=None):
+    """
+    装饰器：追踪时记录函数每次调用的耗时
+
+    参数:
+        name (str): span的名字，None时使用函数的限定名（例如 Level.update）
+    """
+    def decorate(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.add_span(span_name, start, time.perf_counter())
+        return wrapper
+    return decorate